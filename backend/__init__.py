@@ -1,19 +1,27 @@
 import os
 import logging
 
-import africastalking
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from authlib.integrations.flask_client import OAuth
-from flasgger import Swagger
 
 from config import DevelopmentConfig, ProductionConfig
+from backend.apidocs import APIDocs
+from backend.cache import Cache
+from backend.compression import Compress
+from backend.metrics import Metrics
+from backend.notifications import NotificationQueue
+from backend.pool import configure_engines, configure_pool
+from backend.replica import ReplicaRouter, RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
-oauth = OAuth()
-swagger = Swagger()
+apidocs = APIDocs()
+cache = Cache()
+notification_queue = NotificationQueue()
+replica_router = ReplicaRouter()
+metrics = Metrics()
+compress = Compress()
 
 
 def create_app(config=DevelopmentConfig):
@@ -24,28 +32,23 @@ def create_app(config=DevelopmentConfig):
     app = Flask(__name__)
     app.config.from_object(config)
 
+    from .serializers import OrjsonProvider
+
+    app.json = OrjsonProvider(app)
+
     # initializing
+    configure_pool(app.config)
     db.init_app(app)
     migrate.init_app(app, db)
-    oauth.init_app(app)
-    swagger.init_app(app)
-
-    app.orders_api_auth = oauth.register(
-        name="OrdersAPI",
-        client_id=app.config.get("OAUTH2_CLIENT_ID"),
-        client_secret=app.config.get("OAUTH2_CLIENT_SECRET"),
-        server_metadata_url=app.config.get("OAUTH2_META_URL"),
-        client_kwargs={
-            "scope": "openid https://www.googleapis.com/auth/userinfo.profile https://www.googleapis.com/auth/user.phonenumbers.read https://www.googleapis.com/auth/userinfo.email",
-        },
-    )
+    replica_router.init_app(app)
+    configure_engines(app)
+    metrics.init_app(app)
+    compress.init_app(app)
+    apidocs.init_app(app)
+    cache.init_app(app)
+    notification_queue.init_app(app)
 
     if not app.debug and not app.testing:
-        africastalking.initialize(
-            username=app.config.get("AFRICASTALKING_USERNAME"),
-            api_key=app.config.get("AFRICASTALKING_API_KEY"),
-        )
-        app.sms_service = africastalking.SMS
         if app.config["LOG_TO_STDOUT"]:
             stream_handler = logging.StreamHandler()
             stream_handler.setLevel(logging.INFO)
@@ -53,10 +56,17 @@ def create_app(config=DevelopmentConfig):
 
     # register the blueprint
     from .routes import bp
+    from .rollups import rollups_cli
+    from .idempotency import idempotency_cli
+    from .sessions import configure_sessions, sessions_cli
 
     app.register_blueprint(bp)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(idempotency_cli)
+    configure_sessions(app)
+    app.cli.add_command(sessions_cli)
 
     return app
 
 
-from backend import routes, models  # code inserted after app Object is created
+from backend import routes, models, rollups  # code inserted after app Object is created
@@ -0,0 +1,130 @@
+"""Order analytics computed by the database
+
+Every function aggregates with GROUP BY / date_trunc and returns plain dicts
+ready to be serialized, so only the aggregates leave Postgres. Whenever the
+filters line up with day boundaries the queries read the pre-aggregated
+order_daily_rollups table instead of the orders table; amount filters and
+sub-day time ranges fall back to the raw orders.
+"""
+from datetime import time
+
+from flask import current_app
+
+from backend import db
+from backend.filters import order_filters, parse_datetime, parse_int
+from backend.models import Order, OrderDailyRollup
+
+BUCKETS = ["day", "week", "month"]
+
+
+class RawSource(object):
+    """Aggregates straight from the orders table"""
+
+    time = Order.time
+    groups = {"customer": Order.customer_id, "item": Order.item}
+
+    @staticmethod
+    def aggregates():
+        return [
+            db.func.count(Order.id).label("count"),
+            db.func.sum(Order.amount).label("total"),
+            db.func.avg(Order.amount).label("average"),
+            db.func.min(Order.amount).label("min"),
+            db.func.max(Order.amount).label("max"),
+        ]
+
+    @staticmethod
+    def criteria(args):
+        return order_filters(args)
+
+
+class RollupSource(object):
+    """Aggregates of the daily rollups, a few rows per customer and day"""
+
+    time = db.cast(OrderDailyRollup.day, db.DateTime)
+    groups = {"customer": OrderDailyRollup.customer_id, "item": OrderDailyRollup.item}
+
+    @staticmethod
+    def aggregates():
+        count = db.func.coalesce(db.func.sum(OrderDailyRollup.count), 0)
+        total = db.func.sum(OrderDailyRollup.total)
+        return [
+            count.label("count"),
+            total.label("total"),
+            (total / db.func.nullif(count, 0)).label("average"),
+            db.func.min(OrderDailyRollup.min_amount).label("min"),
+            db.func.max(OrderDailyRollup.max_amount).label("max"),
+        ]
+
+    @staticmethod
+    def criteria(args):
+        criteria = []
+        customer_id = parse_int(args, "customer_id")
+        if customer_id is not None:
+            criteria.append(OrderDailyRollup.customer_id == customer_id)
+        since = parse_datetime(args, "since")
+        until = parse_datetime(args, "until")
+        if since is not None:
+            criteria.append(OrderDailyRollup.day >= since.date())
+        if until is not None:
+            criteria.append(OrderDailyRollup.day < until.date())
+        item = args.get("item")
+        if item:
+            criteria.append(OrderDailyRollup.item.startswith(item, autoescape=True))
+        return criteria
+
+
+def get_source(args):
+    """Pick the rollups when they can answer the query exactly"""
+    if not current_app.config["STATS_USE_ROLLUPS"] or args.get("source") == "raw":
+        return RawSource
+    if "min_amount" in args or "max_amount" in args:
+        return RawSource
+    for name in ["since", "until"]:
+        value = parse_datetime(args, name)
+        if value is not None and value.time() != time.min:
+            return RawSource
+    return RollupSource
+
+
+def _to_dict(row, *keys):
+    data = {key: getattr(row, key) for key in keys}
+    data["count"] = row.count
+    for key in ["total", "average", "min", "max"]:
+        value = getattr(row, key)
+        data[key] = round(float(value), 2) if value is not None else None
+    return data
+
+
+def summary(args):
+    """Totals over every order matching the filters in `args`"""
+    source = get_source(args)
+    stmt = db.select(*source.aggregates()).where(*source.criteria(args))
+    return _to_dict(db.session.execute(stmt).one())
+
+
+def grouped(group, args, limit):
+    """Aggregates per customer or per item, biggest total first"""
+    source = get_source(args)
+    column = source.groups[group]
+    stmt = (
+        db.select(column, *source.aggregates())
+        .where(*source.criteria(args))
+        .group_by(column)
+        .order_by(db.desc("total"), column)
+        .limit(limit)
+    )
+    return [_to_dict(row, column.key) for row in db.session.execute(stmt)]
+
+
+def timeseries(bucket, args):
+    """Aggregates per day, week or month bucket of the order time"""
+    source = get_source(args)
+    period = db.func.date_trunc(bucket, source.time).label("period")
+    stmt = (
+        db.select(period, *source.aggregates())
+        .where(*source.criteria(args))
+        .group_by(period)
+        .order_by(period)
+    )
+    return [_to_dict(row, "period") for row in db.session.execute(stmt)]
@@ -0,0 +1,122 @@
+"""Swagger UI and the OpenAPI spec, loaded on the first docs request
+
+flasgger pulls in jsonschema, PyYAML and mistune when imported, so instead
+of calling `Swagger(app)` the app registers the blueprint below. It serves
+the same URLs as flasgger (/apidocs/, /apispec_1.json and the UI's static
+files), and flasgger is only imported by the first request for them.
+
+The spec is built from the endpoint docstrings once per worker, or on every
+request in debug mode. If SWAGGER_SPEC_FILE names a file written by
+`flask apidocs build`, the spec is read from it instead.
+"""
+import importlib.util
+import json
+import os
+import threading
+
+import click
+from flask import Blueprint, current_app, jsonify, redirect, render_template, url_for
+from flask.cli import AppGroup
+
+SPEC_ENDPOINT = "apispec_1"
+
+# located without importing flasgger
+FLASGGER_DIR = importlib.util.find_spec("flasgger").submodule_search_locations[0]
+
+bp = Blueprint(
+    "flasgger",
+    __name__,
+    static_folder=os.path.join(FLASGGER_DIR, "ui3", "static"),
+    template_folder=os.path.join(FLASGGER_DIR, "ui3", "templates"),
+    static_url_path="/flasgger_static",
+)
+
+apidocs_cli = AppGroup("apidocs", help="Manage the API documentation.")
+
+
+def get_config():
+    """flasgger's default config updated with the SWAGGER setting of the app"""
+    from flasgger import Swagger
+
+    config = Swagger.DEFAULT_CONFIG.copy()
+    config.update(current_app.config.get("SWAGGER", {}))
+    return config
+
+
+def build_spec():
+    """Parse the OpenAPI spec of the app from its endpoint docstrings"""
+    from flasgger import Swagger
+
+    swagger = Swagger(config=get_config())
+    # only the spec is wanted: no views are registered and no hooks added
+    swagger.app = current_app._get_current_object()
+    return swagger.get_apispecs(SPEC_ENDPOINT)
+
+
+class APIDocs(object):
+    """Flask extension serving the API docs without importing flasgger"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["apidocs"] = {"spec": None}
+        app.register_blueprint(bp)
+        app.cli.add_command(apidocs_cli)
+
+    def get_spec(self):
+        state = current_app.extensions["apidocs"]
+        if current_app.debug:
+            return build_spec()
+        with self._lock:
+            if state["spec"] is None:
+                path = current_app.config.get("SWAGGER_SPEC_FILE")
+                if path and os.path.exists(path):
+                    with open(path) as f:
+                        state["spec"] = json.load(f)
+                else:
+                    state["spec"] = build_spec()
+        return state["spec"]
+
+
+@bp.route("/apidocs/")
+def apidocs():
+    from flasgger.base import APIDocsView
+
+    view = APIDocsView.as_view("apidocs", view_args={"config": get_config()})
+    return view()
+
+
+@bp.route("/apidocs/index.html")
+def apidocs_index():
+    return redirect(url_for("flasgger.apidocs"))
+
+
+@bp.route(f"/{SPEC_ENDPOINT}.json", endpoint=SPEC_ENDPOINT)
+def apispec():
+    from backend import apidocs
+
+    return jsonify(apidocs.get_spec())
+
+
+@bp.route("/oauth2-redirect.html")
+def oauth_redirect():
+    return render_template("flasgger/oauth2-redirect.html")
+
+
+@apidocs_cli.command("build")
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    help="Where to write the spec, SWAGGER_SPEC_FILE by default.",
+)
+def build_command(output):
+    """Write the OpenAPI spec to a file served instead of parsing docstrings."""
+    output = output or current_app.config.get("SWAGGER_SPEC_FILE")
+    if not output:
+        raise click.UsageError("Pass --output or set SWAGGER_SPEC_FILE.")
+    with open(output, "w") as f:
+        json.dump(build_spec(), f, indent=2)
+    click.echo(f"Wrote the API spec to {output}")
@@ -0,0 +1,308 @@
+"""ASGI entry point serving the API reads with asyncio
+
+The read endpoints of the API, the ones a slow client or a slow report
+query would otherwise pin a sync worker with, are served by Starlette on
+SQLAlchemy's asyncio engine and asyncpg. They share the models, filters,
+pagination and serializers of the Flask app and answer exactly like it.
+Every other request (writes, stats, HTML pages, the docs) is handed to the
+Flask app from `create_app`, which runs in Starlette's thread pool.
+
+The async endpoints read the primary directly: they skip the single lookup
+cache and the read replica routing of the Flask app.
+
+    uvicorn asgi:app
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+"""
+import hashlib
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from starlette.applications import Starlette
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import http_date, is_resource_modified, parse_accept_header
+
+from backend import create_app
+from backend.conditional import order_etag
+from backend.filters import InvalidFilter, order_filters
+from backend.models import Customer, Order
+from backend.pagination import (
+    InvalidPageArgs,
+    keyset,
+    keyset_each,
+    parse_limit,
+    parse_page_args,
+    split_page,
+    split_pages,
+)
+from backend.pool import QUEUE_POOL_OPTIONS, set_statement_timeout
+from backend.serializers import (
+    CUSTOMER_COLUMNS,
+    ORDER_COLUMNS,
+    InvalidFields,
+    InvalidInclude,
+    get_fields,
+    get_include,
+    order_to_dict,
+    project,
+    select_columns,
+)
+from config import DevelopmentConfig
+
+JSON_MIMETYPE = "application/json"
+NDJSON_MIMETYPE = "application/x-ndjson"
+CONDITIONAL_HEADERS = [
+    ("If-None-Match", "HTTP_IF_NONE_MATCH"),
+    ("If-Modified-Since", "HTTP_IF_MODIFIED_SINCE"),
+]
+
+
+def make_async_engine(config):
+    """An asyncpg engine for the database and pool settings of `config`"""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"]).set(
+        drivername="postgresql+asyncpg"
+    )
+    options = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    # the pool class is picked below
+    options.pop("poolclass", None)
+    if config.get("DB_POOL_CLASS") == "null":
+        options["poolclass"] = NullPool
+        for option in QUEUE_POOL_OPTIONS:
+            options.pop(option, None)
+    engine = create_async_engine(url, **options)
+    set_statement_timeout(engine.sync_engine, config.get("DB_STATEMENT_TIMEOUT"))
+    return engine
+
+
+class AsyncAPI(object):
+    """The async endpoints, bound to the Flask app they mirror"""
+
+    def __init__(self, flask_app, engine):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.engine = engine
+
+    def routes(self):
+        return [
+            Route("/api/v1/customers", self.get_customers),
+            Route("/api/v1/customers/{customer_id:int}", self.get_customer),
+            Route(
+                "/api/v1/customers/{customer_id:int}/orders", self.get_customer_orders
+            ),
+            Route("/api/v1/orders", self.get_orders),
+            Route("/api/v1/orders/{order_id:int}", self.get_order),
+        ]
+
+    # responses
+    def dumps(self, obj):
+        json = self.flask_app.json
+        return orjson.dumps(obj, default=json.default, option=json.option)
+
+    def json(self, obj, status_code=200, headers=None):
+        return Response(
+            self.dumps(obj) + b"\n",
+            status_code=status_code,
+            headers=headers,
+            media_type=JSON_MIMETYPE,
+        )
+
+    def error(self, message, status_code=400):
+        return self.json({"error": message}, status_code)
+
+    def not_found(self):
+        return self.error("Not Found", 404)
+
+    def conditional(self, request, body, etag=None, last_modified=None, headers=None):
+        """Answer with `body`, or a 304 when the client's copy is still fresh"""
+        headers = dict(headers or {})
+        body += b"\n"
+        if etag is None:
+            etag = hashlib.sha1(body).hexdigest()
+        headers["ETag"] = f'"{etag}"'
+        if last_modified is not None:
+            headers["Last-Modified"] = http_date(last_modified)
+        # werkzeug only reads these keys of the WSGI environ
+        environ = {"REQUEST_METHOD": request.method}
+        for name, key in CONDITIONAL_HEADERS:
+            if name in request.headers:
+                environ[key] = request.headers[name]
+        if not is_resource_modified(environ, etag=etag, last_modified=last_modified):
+            return Response(status_code=304, headers=headers)
+        return Response(body, headers=headers, media_type=JSON_MIMETYPE)
+
+    def page_headers(self, request, next_cursor):
+        if not next_cursor:
+            return {}
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        return {"Link": f'<{next_url}>; rel="next"', "X-Next-Cursor": next_cursor}
+
+    async def fetch_all(self, stmt):
+        async with self.engine.connect() as connection:
+            result = await connection.execute(stmt)
+            return result.all()
+
+    # customers
+    async def get_customers(self, request):
+        args = request.query_params
+        try:
+            limit, last_id = parse_page_args(args, self.config)
+            fields = get_fields(args, CUSTOMER_COLUMNS)
+            include = get_include(args, ["orders"])
+            if include:
+                orders_limit = parse_limit(
+                    args,
+                    self.config,
+                    "orders_limit",
+                    self.config["API_NESTED_PAGE_SIZE"],
+                )
+        except (InvalidPageArgs, InvalidFields, InvalidInclude) as e:
+            return self.error(str(e))
+        columns = select_columns(CUSTOMER_COLUMNS, fields, [Customer.id])
+        stmt = keyset(select(*columns), Customer.id, limit, last_id)
+        customers, next_cursor = split_page(await self.fetch_all(stmt), limit)
+        customer_list = [project(c, fields) for c in customers]
+        if include:
+            await self.embed_orders(request, customers, customer_list, orders_limit)
+        headers = self.page_headers(request, next_cursor)
+        return self.conditional(request, self.dumps(customer_list), headers=headers)
+
+    async def embed_orders(self, request, customers, customer_list, limit):
+        ids = [c.id for c in customers]
+        if not ids:
+            return
+        stmt = keyset_each(ORDER_COLUMNS, Order.customer_id, Order.id, ids, limit)
+        pages = split_pages(
+            await self.fetch_all(stmt), Order.customer_id, Order.id, ids, limit
+        )
+        for row, customer in zip(customers, customer_list):
+            orders, next_cursor = pages[row.id]
+            customer["orders"] = [order_to_dict(o) for o in orders]
+            customer["orders_next"] = None
+            if next_cursor:
+                customer["orders_next"] = str(
+                    request.url_for(
+                        "get_customer_orders", customer_id=row.id
+                    ).include_query_params(limit=limit, cursor=next_cursor)
+                )
+
+    async def get_customer(self, request):
+        try:
+            fields = get_fields(request.query_params, CUSTOMER_COLUMNS)
+        except InvalidFields as e:
+            return self.error(str(e))
+        customer_id = request.path_params["customer_id"]
+        stmt = select(*select_columns(CUSTOMER_COLUMNS, fields)).where(
+            Customer.id == customer_id
+        )
+        rows = await self.fetch_all(stmt)
+        if not rows:
+            return self.not_found()
+        return self.conditional(request, self.dumps(project(rows[0], fields)))
+
+    # orders
+    async def get_customer_orders(self, request):
+        args = request.query_params
+        customer_id = request.path_params["customer_id"]
+        try:
+            criteria = order_filters(args)
+            fields = get_fields(args, ORDER_COLUMNS)
+            limit, last_id = parse_page_args(args, self.config)
+        except (InvalidFilter, InvalidPageArgs, InvalidFields) as e:
+            return self.error(str(e))
+        columns = select_columns(ORDER_COLUMNS, fields, [Order.id])
+        stmt = keyset(
+            select(*columns).where(Order.customer_id == customer_id, *criteria),
+            Order.id,
+            limit,
+            last_id,
+        )
+        async with self.engine.connect() as connection:
+            exists = await connection.scalar(
+                select(Customer.id).where(Customer.id == customer_id)
+            )
+            if exists is None:
+                return self.not_found()
+            rows = (await connection.execute(stmt)).all()
+        orders, next_cursor = split_page(rows, limit)
+        body = self.dumps([project(o, fields) for o in orders])
+        return self.conditional(
+            request, body, headers=self.page_headers(request, next_cursor)
+        )
+
+    async def get_orders(self, request):
+        args = request.query_params
+        try:
+            criteria = order_filters(args)
+            fields = get_fields(args, ORDER_COLUMNS)
+            if self.wants_stream(request):
+                return self.stream_orders(criteria, fields)
+            limit, last_id = parse_page_args(args, self.config)
+        except (InvalidFilter, InvalidPageArgs, InvalidFields) as e:
+            return self.error(str(e))
+        columns = select_columns(ORDER_COLUMNS, fields, [Order.id])
+        stmt = keyset(select(*columns).where(*criteria), Order.id, limit, last_id)
+        orders, next_cursor = split_page(await self.fetch_all(stmt), limit)
+        body = self.dumps([project(o, fields) for o in orders])
+        return self.conditional(
+            request, body, headers=self.page_headers(request, next_cursor)
+        )
+
+    def wants_stream(self, request):
+        if request.query_params.get("stream") in ("1", "true"):
+            return True
+        accept = parse_accept_header(request.headers.get("Accept"), MIMEAccept)
+        return accept.best_match([JSON_MIMETYPE, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+    def stream_orders(self, criteria, fields):
+        """Stream the matching orders as NDJSON from a server-side cursor"""
+        chunk_size = self.config["STREAM_CHUNK_SIZE"]
+        columns = select_columns(ORDER_COLUMNS, fields, [Order.id])
+        stmt = select(*columns).where(*criteria).order_by(Order.id)
+
+        async def generate():
+            async with self.engine.connect() as connection:
+                result = await connection.stream(
+                    stmt.execution_options(yield_per=chunk_size)
+                )
+                async for rows in result.partitions():
+                    yield b"".join(self.dumps(project(o, fields)) + b"\n" for o in rows)
+
+        return StreamingResponse(generate(), media_type=NDJSON_MIMETYPE)
+
+    async def get_order(self, request):
+        try:
+            fields = get_fields(request.query_params, ORDER_COLUMNS)
+        except InvalidFields as e:
+            return self.error(str(e))
+        order_id = request.path_params["order_id"]
+        stmt = select(*ORDER_COLUMNS, Order.updated).where(Order.id == order_id)
+        rows = await self.fetch_all(stmt)
+        if not rows:
+            return self.not_found()
+        order = rows[0]
+        etag = order_etag(order_id, order.updated)
+        body = self.dumps(project(order, fields))
+        return self.conditional(request, body, etag, order.updated)
+
+
+def create_asgi_app(config=DevelopmentConfig):
+    """Build the ASGI app: async API reads in front of the Flask app"""
+    flask_app = create_app(config)
+    engine = make_async_engine(flask_app.config)
+    api = AsyncAPI(flask_app, engine)
+
+    async def dispose_engine():
+        await engine.dispose()
+
+    app = Starlette(
+        routes=api.routes() + [Mount("/", WSGIMiddleware(flask_app))],
+        on_shutdown=[dispose_engine],
+    )
+    app.state.flask_app = flask_app
+    app.state.engine = engine
+    return app
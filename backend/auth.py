@@ -0,0 +1,40 @@
+"""Google sign in, set up on the first login
+
+Importing authlib costs a worker over 100ms of boot time, so the OAuth
+client is registered by the first request that needs it rather than by
+`create_app`. authlib fetches the OIDC metadata at OAUTH2_META_URL on the
+first login and keeps it on the client, which lives for as long as the app.
+"""
+import threading
+
+from flask import current_app
+
+SCOPES = [
+    "openid",
+    "https://www.googleapis.com/auth/userinfo.profile",
+    "https://www.googleapis.com/auth/user.phonenumbers.read",
+    "https://www.googleapis.com/auth/userinfo.email",
+]
+
+_lock = threading.Lock()
+
+
+def get_oauth_client():
+    """The OrdersAPI OAuth client of the current app, registered on first use"""
+    app = current_app._get_current_object()
+    client = app.extensions.get("orders_api_auth")
+    if client is None:
+        with _lock:
+            client = app.extensions.get("orders_api_auth")
+            if client is None:
+                from authlib.integrations.flask_client import OAuth
+
+                client = OAuth(app).register(
+                    name="OrdersAPI",
+                    client_id=app.config.get("OAUTH2_CLIENT_ID"),
+                    client_secret=app.config.get("OAUTH2_CLIENT_SECRET"),
+                    server_metadata_url=app.config.get("OAUTH2_META_URL"),
+                    client_kwargs={"scope": " ".join(SCOPES)},
+                )
+                app.extensions["orders_api_auth"] = client
+    return client
@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class BaseCache(object):
+    """Interface of the cache backends, counting hits and misses"""
+
+    name = "base"
+
+    def __init__(self, default_timeout=60):
+        self.default_timeout = default_timeout
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key):
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def stats(self):
+        return {"backend": self.name, "hits": self.hits, "misses": self.misses}
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, timeout=None):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class NullCache(BaseCache):
+    """Never stores anything, every lookup goes to the database"""
+
+    name = "null"
+
+    def _get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCache(BaseCache):
+    """In-process cache bounded by both size and age
+
+    Entries expire `timeout` seconds after they are set and the least
+    recently used entry is evicted once `max_size` entries are stored. The
+    cache lives in each worker process, so a write in one worker only
+    invalidates that worker's copy; the others catch up once the entry
+    expires.
+    """
+
+    name = "lru"
+
+    def __init__(self, max_size=10000, default_timeout=60):
+        super().__init__(default_timeout)
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        stats = super().stats()
+        stats["size"] = len(self._entries)
+        return stats
+
+
+class RedisCache(BaseCache):
+    """Cache shared by every worker, stored in Redis
+
+    `client` only needs the `get`, `set(key, value, ex=...)`, `delete` and
+    `scan_iter` methods of `redis.Redis`, so any compatible server or local
+    stand-in works. Values are stored as JSON, encoded with the app's JSON
+    provider so they come back exactly as the API would send them.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, key_prefix="orders-api:", default_timeout=60):
+        super().__init__(default_timeout)
+        self.client = client
+        self.key_prefix = key_prefix
+
+    def _get(self, key):
+        value = self.client.get(self.key_prefix + key)
+        if value is None:
+            return None
+        return current_app.json.loads(value)
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        value = current_app.json.dumps(value)
+        self.client.set(self.key_prefix + key, value, ex=timeout)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.key_prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.key_prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def make_backend(config, redis_client=None):
+    """Build the cache backend selected by CACHE_TYPE
+
+    The Redis backend connects to CACHE_REDIS_URL unless a `redis_client`
+    is given, such as a client shared with the rest of the app.
+    """
+    cache_type = config["CACHE_TYPE"]
+    timeout = config["CACHE_DEFAULT_TIMEOUT"]
+    if cache_type == "null":
+        return NullCache(default_timeout=timeout)
+    if cache_type == "lru":
+        return LRUCache(max_size=config["CACHE_MAX_SIZE"], default_timeout=timeout)
+    if cache_type == "redis":
+        if redis_client is None:
+            import redis  # only needed when the Redis backend is selected
+
+            redis_client = redis.Redis.from_url(config["CACHE_REDIS_URL"])
+        return RedisCache(
+            redis_client, key_prefix=config["CACHE_KEY_PREFIX"], default_timeout=timeout
+        )
+    raise ValueError(f"Unknown CACHE_TYPE {cache_type!r}")
+
+
+class Cache(object):
+    """Flask extension giving access to the cache backend of the current app"""
+
+    def __init__(self, app=None, redis_client=None):
+        if app is not None:
+            self.init_app(app, redis_client)
+
+    def init_app(self, app, redis_client=None):
+        app.extensions["cache"] = make_backend(app.config, redis_client)
+
+    @property
+    def backend(self):
+        return current_app.extensions["cache"]
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.backend.set(key, value, timeout)
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
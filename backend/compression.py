@@ -0,0 +1,179 @@
+"""Compression of responses negotiated with Accept-Encoding
+
+Bodies of the text types below are compressed with the first algorithm of
+COMPRESS_ALGORITHMS (zstd, br, gzip by default) that the client accepts with
+the highest quality. Brotli and zstd come from the `brotli` and
+`zstandard` packages of requirements.txt; an install missing one of them
+leaves that algorithm out, with a warning, rather than failing. Bodies
+smaller than COMPRESS_MIN_SIZE bytes are sent as they are, as compressing
+them saves less than it costs.
+
+Streamed responses, like the NDJSON export, are compressed chunk by chunk
+and flushed after every chunk, so clients still get rows as they are read.
+
+A compressed body is a different representation from the uncompressed one,
+so its strong ETag is turned into a weak one. If-None-Match uses the weak
+comparison, so clients revalidate either representation against the ETag
+computed by the views.
+
+Only the Flask app compresses: the async reads of `backend.asgi` do not.
+"""
+import zlib
+
+from flask import current_app, request
+
+COMPRESS_MIMETYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+}
+
+
+class GzipCodec(object):
+    name = "gzip"
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        # wbits=31 writes the gzip header and trailer around the deflate data
+        return zlib.compress(data, self.level, wbits=31)
+
+    def stream(self, chunks):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+class BrotliCodec(object):
+    name = "br"
+
+    def __init__(self, level):
+        import brotli
+
+        self.brotli = brotli
+        self.level = level
+
+    def compress(self, data):
+        return self.brotli.compress(data, quality=self.level)
+
+    def stream(self, chunks):
+        compressor = self.brotli.Compressor(quality=self.level)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+
+
+class ZstdCodec(object):
+    name = "zstd"
+
+    def __init__(self, level):
+        import zstandard
+
+        self.zstandard = zstandard
+        self.compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def stream(self, chunks):
+        compressor = self.compressor.compressobj()
+        flush_block = self.zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(flush_block)
+        yield compressor.flush()
+
+
+CODECS = {"zstd": ZstdCodec, "br": BrotliCodec, "gzip": GzipCodec}
+
+
+def make_codecs(app):
+    """The codecs of COMPRESS_ALGORITHMS whose library is installed, in order"""
+    codecs = []
+    for name in app.config["COMPRESS_ALGORITHMS"].split(","):
+        name = name.strip()
+        if name not in CODECS:
+            raise ValueError(f"Unknown compression algorithm {name!r}")
+        level = app.config[f"COMPRESS_{name.upper()}_LEVEL"]
+        try:
+            codecs.append(CODECS[name](level))
+        except ImportError as e:
+            app.logger.warning(f"[COMPRESSION]: {name} is not available: {e}")
+    return codecs
+
+
+def _close_after(chunks, iterable):
+    """Yield `chunks`, then close the `iterable` they were produced from"""
+    try:
+        yield from chunks
+    finally:
+        if hasattr(iterable, "close"):
+            iterable.close()
+
+
+class Compress(object):
+    """Flask extension compressing the responses the client accepts it for"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["compress"] = {"codecs": make_codecs(app)}
+        if app.config["COMPRESS_ENABLED"]:
+            app.after_request(self._after_request)
+
+    def negotiate(self):
+        """The codec to answer the current request with, or None"""
+        codecs = current_app.extensions["compress"]["codecs"]
+        names = [codec.name for codec in codecs]
+        best = request.accept_encodings.best_match(names)
+        if best is None:
+            return None
+        return codecs[names.index(best)]
+
+    def _after_request(self, response):
+        if response.mimetype not in COMPRESS_MIMETYPES:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (
+            response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or "no-transform" in response.headers.get("Cache-Control", "")
+            or request.method == "HEAD"
+        ):
+            return response
+        codec = self.negotiate()
+        if codec is None:
+            return response
+        if response.status_code == 304:
+            # the 200 this stands for may have been compressed, and so weak
+            self._weaken_etag(response)
+            return response
+        if response.status_code != 200:
+            return response
+
+        if response.is_streamed:
+            iterable = response.response
+            chunks = codec.stream(response.iter_encoded())
+            response.response = _close_after(chunks, iterable)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < current_app.config["COMPRESS_MIN_SIZE"]:
+                return response
+            response.set_data(codec.compress(data))
+        response.headers["Content-Encoding"] = codec.name
+        self._weaken_etag(response)
+        return response
+
+    def _weaken_etag(self, response):
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
@@ -0,0 +1,41 @@
+from hashlib import sha1
+
+from flask import request, Response
+from werkzeug.http import is_resource_modified
+
+
+def order_etag(order_id, updated):
+    """Strong ETag of an order, derived from its id and `updated` timestamp"""
+    stamp = updated.isoformat() if updated else ""
+    return sha1(f"order:{order_id}:{stamp}".encode()).hexdigest()
+
+
+def is_modified(etag=None, last_modified=None):
+    """Whether the client's If-None-Match / If-Modified-Since copy is stale"""
+    return is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+
+def not_modified_response(etag=None, last_modified=None):
+    """An empty 304 response carrying the validators of the resource"""
+    response = Response(status=304)
+    if etag:
+        response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+
+def conditional_response(response, etag=None, last_modified=None):
+    """Attach the validators to `response` and turn it into a 304 on a match
+
+    Without an explicit `etag` a strong ETag is computed from a hash of the
+    serialized body, which is what the listings and customers use since they
+    have no modification timestamp.
+    """
+    if etag is None:
+        response.add_etag()
+    else:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response.make_conditional(request)
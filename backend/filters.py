@@ -0,0 +1,78 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from backend.models import Order
+
+
+class InvalidFilter(Exception):
+    """Raised when a filter query parameter cannot be parsed"""
+
+
+def parse_datetime(args, name):
+    """Parse an ISO-8601 query parameter, e.g. 2023-09-15 or 2023-09-15T09:31"""
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidFilter(f"{name} must be an ISO-8601 date or datetime!")
+
+
+def parse_amount(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise InvalidFilter(f"{name} must be a number!")
+
+
+def parse_int(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidFilter(f"{name} must be an integer!")
+
+
+def time_range_filters(args, column=Order.time):
+    """Build the `since` (inclusive) and `until` (exclusive) criteria"""
+    criteria = []
+    since = parse_datetime(args, "since")
+    until = parse_datetime(args, "until")
+    if since is not None:
+        criteria.append(column >= since)
+    if until is not None:
+        criteria.append(column < until)
+    return criteria
+
+
+def order_filters(args):
+    """Translate the order listing query parameters into SQL criteria
+
+    Supported parameters are `customer_id`, `since`, `until`, `min_amount`,
+    `max_amount` and `item` (a prefix match). The criteria are pushed down to
+    the database so the (customer_id, time) index can serve them.
+    """
+    criteria = []
+    customer_id = parse_int(args, "customer_id")
+    if customer_id is not None:
+        criteria.append(Order.customer_id == customer_id)
+
+    criteria.extend(time_range_filters(args))
+
+    min_amount = parse_amount(args, "min_amount")
+    max_amount = parse_amount(args, "max_amount")
+    if min_amount is not None:
+        criteria.append(Order.amount >= min_amount)
+    if max_amount is not None:
+        criteria.append(Order.amount <= max_amount)
+
+    item = args.get("item")
+    if item:
+        criteria.append(Order.item.startswith(item, autoescape=True))
+    return criteria
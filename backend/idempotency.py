@@ -0,0 +1,139 @@
+"""Idempotency-Key support for the endpoints creating orders
+
+A client retrying a POST after a timeout cannot know whether the first
+attempt went through. When it sends the same `Idempotency-Key` header with
+every attempt, the first one to succeed stores its response in the
+idempotency_keys table, in the same transaction as the orders it created,
+and every retry gets that stored response back without running the
+endpoint again.
+
+The key row is locked with SELECT ... FOR UPDATE for the whole request, so
+a retry arriving while the first attempt is still running waits for it and
+then replays its response, instead of creating the orders a second time.
+Requests that fail write nothing, key included, and can be retried as is.
+
+A key sent again with a different body or to a different endpoint is
+refused with a 422. Keys expire after IDEMPOTENCY_KEY_TTL seconds, after
+which they can be reused; `flask idempotency purge` deletes the expired
+ones.
+"""
+from datetime import datetime, timedelta
+from functools import wraps
+from hashlib import sha256
+
+import click
+from flask import current_app, request
+from flask.cli import AppGroup
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from backend import db, services
+from backend.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+idempotency_cli = AppGroup("idempotency", help="Manage the idempotency keys.")
+
+
+def get_fingerprint():
+    """Hash of what identifies the current request besides its key"""
+    digest = sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def lock_key(key, fingerprint):
+    """Claim `key`, waiting for any request holding it, and return its row"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=current_app.config["IDEMPOTENCY_KEY_TTL"])
+    db.session.execute(
+        pg_insert(IdempotencyKey)
+        .values(key=key, fingerprint=fingerprint, created=now, expires_at=expires_at)
+        .on_conflict_do_nothing(index_elements=[IdempotencyKey.key])
+    )
+    record = db.session.get(
+        IdempotencyKey, key, with_for_update=True, populate_existing=True
+    )
+    if record.expires_at <= now:
+        # an expired key is as good as a new one
+        record.fingerprint = fingerprint
+        record.status_code = record.mimetype = record.response_body = None
+        record.created = now
+        record.expires_at = expires_at
+    return record
+
+
+def replay(record):
+    response = current_app.response_class(
+        record.response_body, status=record.status_code, mimetype=record.mimetype
+    )
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+def idempotent(view):
+    """Let clients retry `view` safely by sending an Idempotency-Key"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not 0 < len(key) <= 255:
+            raise services.ServiceError(f"{HEADER} must be 1 to 255 characters!")
+
+        fingerprint = get_fingerprint()
+        record = lock_key(key, fingerprint)
+        if record.fingerprint != fingerprint:
+            db.session.rollback()
+            raise services.ServiceError(
+                f"This {HEADER} was already used with a different request!", 422
+            )
+        if record.status_code is not None:
+            response = replay(record)
+            # releases the lock
+            db.session.rollback()
+            return response
+
+        try:
+            with services.deferred_commit():
+                response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            raise
+        if not 200 <= response.status_code < 300:
+            db.session.rollback()
+            return response
+        record.status_code = response.status_code
+        record.mimetype = response.mimetype
+        record.response_body = response.get_data()
+        db.session.commit()
+        return response
+
+    return wrapper
+
+
+def purge(batch_size=1000):
+    """Delete the expired keys in batches, returning how many were deleted"""
+    deleted = 0
+    while True:
+        expired = (
+            db.select(IdempotencyKey.key)
+            .where(IdempotencyKey.expires_at <= datetime.utcnow())
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        result = db.session.execute(
+            db.delete(IdempotencyKey).where(IdempotencyKey.key.in_(expired))
+        )
+        db.session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+@idempotency_cli.command("purge")
+@click.option("--batch-size", default=1000, help="Keys deleted per transaction.")
+def purge_command(batch_size):
+    """Delete the expired idempotency keys."""
+    click.echo(f"Deleted {purge(batch_size)} expired idempotency keys")
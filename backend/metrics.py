@@ -0,0 +1,143 @@
+"""Request timing and database instrumentation
+
+Every request of the Flask app records its latency, the number of SQL
+statements it ran and the time they took, per endpoint, into Prometheus
+histograms served at /metrics. The same numbers go back to the client in a
+`Server-Timing` header, which browsers show in their network panel, and
+statements slower than DB_SLOW_QUERY_MS are logged.
+
+Under gunicorn every worker writes its metrics to a file in
+PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py) and /metrics adds them up,
+so a scrape sees the whole dyno and not just the worker answering it.
+
+Streamed responses are timed up to the start of the stream, and the async
+reads of `backend.asgi` are not instrumented.
+"""
+import os
+import time
+
+from flask import Blueprint, Response, current_app, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+REQUEST_LATENCY = Histogram(
+    "orders_api_request_duration_seconds",
+    "Time spent answering requests",
+    ["method", "endpoint", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "orders_api_request_db_queries",
+    "SQL statements run per request",
+    ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float("inf")),
+)
+REQUEST_DB_TIME = Histogram(
+    "orders_api_request_db_duration_seconds",
+    "Time spent running SQL statements per request",
+    ["endpoint"],
+)
+SLOW_QUERIES = Counter(
+    "orders_api_db_slow_queries",
+    "SQL statements slower than DB_SLOW_QUERY_MS",
+    ["endpoint"],
+)
+
+bp = Blueprint("metrics", __name__)
+
+
+def get_endpoint():
+    # unmatched URLs share a label, so scanners cannot blow up the series
+    return request.endpoint or "unmatched"
+
+
+class Metrics(object):
+    """Flask extension timing requests and the SQL they run"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config["METRICS_ENABLED"]:
+            return
+        # imported here as this module is loaded before the extensions exist
+        from backend import db, replica_router
+
+        with app.app_context():
+            engines = list(db.engines.values())
+            if replica_router.engine is not None:
+                engines.append(replica_router.engine)
+        for engine in engines:
+            self.instrument_engine(app, engine)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.register_blueprint(bp)
+
+    def instrument_engine(self, app, engine):
+        """Count the statements of `engine` and log the slow ones"""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, *args):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "handle_error")
+        def handle_error(exception_context):
+            # after_cursor_execute is not called for a statement that failed
+            conn = exception_context.connection
+            if conn is not None and conn.info.get("query_started"):
+                conn.info["query_started"].pop()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, *args):
+            elapsed = time.perf_counter() - conn.info["query_started"].pop()
+            in_request = has_request_context() and "db_queries" in g
+            if in_request:
+                g.db_queries += 1
+                g.db_time += elapsed
+            threshold = app.config["DB_SLOW_QUERY_MS"]
+            if threshold and elapsed * 1000 >= threshold:
+                endpoint = get_endpoint() if in_request else "none"
+                SLOW_QUERIES.labels(endpoint).inc()
+                app.logger.warning(
+                    f"[SLOW QUERY]: {elapsed * 1000:.0f}ms in {endpoint}: {statement}"
+                )
+
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+
+    def _after_request(self, response):
+        if "request_started" not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_started
+        endpoint = get_endpoint()
+        REQUEST_LATENCY.labels(
+            request.method, endpoint, str(response.status_code)
+        ).observe(elapsed)
+        REQUEST_DB_QUERIES.labels(endpoint).observe(g.db_queries)
+        REQUEST_DB_TIME.labels(endpoint).observe(g.db_time)
+        if current_app.config["SERVER_TIMING"]:
+            response.headers["Server-Timing"] = (
+                f'db;desc="{g.db_queries} queries";dur={g.db_time * 1000:.1f}, '
+                f"app;dur={elapsed * 1000:.1f}"
+            )
+        return response
+
+
+@bp.route("/metrics")
+def metrics():
+    """The metrics of this process, or of every worker under gunicorn"""
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -7,7 +7,7 @@ class Customer(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
-    email = db.Column(db.String(100), nullable=False, index=True)
+    email = db.Column(db.String(100), nullable=False, index=True, unique=True)
     contact = db.Column(db.String(12), nullable=False)
 
     # Define a relationship with orders
@@ -21,7 +21,9 @@ class Order(db.Model):
     __tablename__ = "orders"
 
     id = db.Column(db.Integer, primary_key=True)
-    customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), nullable=False)
+    customer_id = db.Column(
+        db.Integer, db.ForeignKey("customers.id"), nullable=False, index=True
+    )
     item = db.Column(db.String(255), nullable=False)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     time = db.Column(db.DateTime, index=True, default=datetime.utcnow)
@@ -29,5 +31,92 @@ class Order(db.Model):
         db.DateTime, index=True, default=datetime.utcnow, onupdate=datetime.utcnow
     )  # The Date of the Instance Update => Changed with Every Update
 
+    # serves the per customer time range queries of the order listing
+    __table_args__ = (db.Index("ix_orders_customer_id_time", "customer_id", "time"),)
+
+    def __repr__(self):
+        # the customer id, as loading the customer would cost a query per order
+        return f"<Order {self.item} by Customer {self.customer_id}>"
+
+
+class OrderDailyRollup(db.Model):
+    """Orders pre-aggregated per day, customer and item for the analytics"""
+
+    __tablename__ = "order_daily_rollups"
+
+    day = db.Column(db.Date, primary_key=True)
+    customer_id = db.Column(db.Integer, primary_key=True)
+    item = db.Column(db.String(255), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Numeric(14, 2), nullable=False)
+    min_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    max_amount = db.Column(db.Numeric(10, 2), nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_order_daily_rollups_customer_id_day", "customer_id", "day"),
+    )
+
+    def __repr__(self):
+        return f"<OrderDailyRollup {self.day} {self.customer_id} {self.item}>"
+
+
+class Notification(db.Model):
+    """An outbound SMS, queued until the notification worker delivers it"""
+
+    __tablename__ = "notifications"
+
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(20))
+    recipient = db.Column(db.String(20), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    # pending => waiting to be sent, sent => accepted by the provider,
+    # failed => gave up after NOTIFICATIONS_MAX_ATTEMPTS
+    status = db.Column(db.String(10), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    provider_status = db.Column(db.String(50))  # status reported by the provider
+    last_error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    # serves the worker's "due pending notifications" query
+    __table_args__ = (
+        db.Index(
+            "ix_notifications_status_next_attempt_at", "status", "next_attempt_at"
+        ),
+    )
+
+    def __repr__(self):
+        return f"<Notification {self.id} to {self.recipient} ({self.status})>"
+
+
+class IdempotencyKey(db.Model):
+    """The response of a request sent with an Idempotency-Key header"""
+
+    __tablename__ = "idempotency_keys"
+
+    key = db.Column(db.String(255), primary_key=True)
+    # hash of the method, path and body the key was first used with
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # null until the request has succeeded
+    status_code = db.Column(db.Integer)
+    mimetype = db.Column(db.String(100))
+    response_body = db.Column(db.LargeBinary)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.key} ({self.status_code})>"
+
+
+class UserSession(db.Model):
+    """Data of a browser session, whose cookie only holds the id"""
+
+    __tablename__ = "user_sessions"
+
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
     def __repr__(self):
-        return f"<Order {self.item} by Customer {self.customer}>"
+        return f"<UserSession expiring {self.expires_at}>"
@@ -0,0 +1,232 @@
+"""Outbound SMS queue
+
+Notifications are written to the `notifications` table and delivered by a
+background worker thread, so the SMS provider's latency and failures never
+reach the request that queued them. Pending notifications are claimed with
+`FOR UPDATE SKIP LOCKED`, which lets the worker of every gunicorn process
+(and `flask notifications process`) drain the same table safely.
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+from itertools import groupby
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+# Africa's Talking status codes meaning the message was accepted
+SMS_SUCCESS_CODES = {100, 101, 102}
+
+notifications_cli = AppGroup("notifications", help="Manage the SMS queue.")
+
+
+class FakeSMSService(object):
+    """Stand-in for africastalking.SMS which records the messages it sends"""
+
+    def __init__(self):
+        self.outbox = []
+        self.fail_with = None  # set to an exception to simulate outages
+
+    def send(self, message, recipients, sender_id=None):
+        if self.fail_with is not None:
+            raise self.fail_with
+        self.outbox.append(
+            {"message": message, "recipients": recipients, "sender": sender_id}
+        )
+        return {
+            "SMSMessageData": {
+                "Message": f"Sent to {len(recipients)}/{len(recipients)}",
+                "Recipients": [
+                    {"number": number, "status": "Success", "statusCode": 101}
+                    for number in recipients
+                ],
+            }
+        }
+
+
+def make_sms_service(app):
+    """Build the SMS backend selected by SMS_BACKEND
+
+    Without an explicit setting, debug and testing apps get the fake backend
+    and everything else talks to Africa's Talking.
+    """
+    backend = app.config.get("SMS_BACKEND")
+    if backend is None:
+        backend = "fake" if app.debug or app.testing else "africastalking"
+    if backend == "fake":
+        return FakeSMSService()
+    if backend == "africastalking":
+        import africastalking
+
+        africastalking.initialize(
+            username=app.config.get("AFRICASTALKING_USERNAME"),
+            api_key=app.config.get("AFRICASTALKING_API_KEY"),
+        )
+        return africastalking.SMS
+    raise ValueError(f"Unknown SMS_BACKEND {backend!r}")
+
+
+class NotificationQueue(object):
+    """Flask extension queueing SMS notifications and delivering them"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["notifications"] = {
+            # built on the first send, which keeps the SDK out of the boot
+            "sms_service": None,
+            "worker": None,
+            "worker_pid": None,
+            "wakeup": threading.Event(),
+        }
+        app.cli.add_command(notifications_cli)
+
+    @property
+    def _state(self):
+        return current_app.extensions["notifications"]
+
+    @property
+    def sms_service(self):
+        state = self._state
+        if state["sms_service"] is None:
+            with self._lock:
+                if state["sms_service"] is None:
+                    state["sms_service"] = make_sms_service(current_app)
+        return state["sms_service"]
+
+    def enqueue(self, recipient, message, sender=None):
+        """Queue an SMS and wake up the worker of this process"""
+        # imported here as the extension is created before the models exist
+        from backend import db
+        from backend.models import Notification
+
+        notification = Notification(recipient=recipient, message=message, sender=sender)
+        db.session.add(notification)
+        db.session.commit()
+        if current_app.config["NOTIFICATIONS_WORKER"]:
+            self._ensure_worker()
+            self._state["wakeup"].set()
+        return notification
+
+    def process_pending(self, limit=None):
+        """Deliver the notifications that are due, returning how many were tried"""
+        from backend import db
+        from backend.models import Notification
+
+        config = current_app.config
+        limit = limit or config["NOTIFICATIONS_BATCH_SIZE"]
+        now = datetime.utcnow()
+        due = (
+            Notification.query.filter(
+                Notification.status == "pending", Notification.next_attempt_at <= now
+            )
+            .order_by(Notification.sender, Notification.message, Notification.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        # identical messages from the same sender go out in a single request
+        for (sender, message), batch in groupby(
+            due, key=lambda n: (n.sender, n.message)
+        ):
+            self._send_batch(sender, message, list(batch), now)
+        db.session.commit()
+        return len(due)
+
+    def _send_batch(self, sender, message, batch, now):
+        for notification in batch:
+            notification.attempts += 1
+        try:
+            response = self.sms_service.send(
+                message, [n.recipient for n in batch], sender
+            )
+        except Exception as e:
+            current_app.logger.warning(f"[MESSAGE ERROR]: {e}")
+            for notification in batch:
+                self._retry_later(notification, str(e), now)
+            return
+
+        recipients = response.get("SMSMessageData", {}).get("Recipients", [])
+        statuses = {r.get("number"): r for r in recipients}
+        for notification in batch:
+            result = statuses.get(notification.recipient, {})
+            notification.provider_status = result.get("status")
+            if result.get("statusCode") in SMS_SUCCESS_CODES:
+                notification.status = "sent"
+                notification.sent_at = now
+                notification.last_error = None
+            else:
+                error = result.get("status") or "No status returned by the provider"
+                self._retry_later(notification, error, now)
+
+    def _retry_later(self, notification, error, now):
+        config = current_app.config
+        notification.last_error = error
+        if notification.attempts >= config["NOTIFICATIONS_MAX_ATTEMPTS"]:
+            notification.status = "failed"
+            return
+        # exponential backoff: base, 2 * base, 4 * base, ...
+        delay = config["NOTIFICATIONS_RETRY_BACKOFF"] * 2 ** (notification.attempts - 1)
+        notification.next_attempt_at = now + timedelta(seconds=delay)
+
+    def _ensure_worker(self):
+        """Start the worker thread of this process if it is not running
+
+        The thread is started lazily, and again after a fork, since threads do
+        not survive into gunicorn's forked workers.
+        """
+        state = self._state
+        with self._lock:
+            worker = state["worker"]
+            if worker and worker.is_alive() and state["worker_pid"] == os.getpid():
+                return
+            app = current_app._get_current_object()
+            state["wakeup"] = threading.Event()
+            state["worker"] = threading.Thread(
+                target=self._run_worker,
+                args=(app, state["wakeup"]),
+                name="notifications-worker",
+                daemon=True,
+            )
+            state["worker_pid"] = os.getpid()
+            state["worker"].start()
+
+    def _run_worker(self, app, wakeup):
+        from backend import db
+
+        interval = app.config["NOTIFICATIONS_POLL_INTERVAL"]
+        while True:
+            wakeup.wait(interval)
+            wakeup.clear()
+            with app.app_context():
+                try:
+                    # keep going while full batches are coming back
+                    while (
+                        self.process_pending() == app.config["NOTIFICATIONS_BATCH_SIZE"]
+                    ):
+                        pass
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Failed to process notifications")
+                finally:
+                    db.session.remove()
+
+
+@notifications_cli.command("process")
+@click.option("--loop", is_flag=True, help="Keep polling instead of exiting.")
+def process_command(loop):
+    """Deliver the pending notifications that are due."""
+    from backend import notification_queue
+
+    interval = current_app.config["NOTIFICATIONS_POLL_INTERVAL"]
+    while True:
+        count = notification_queue.process_pending()
+        click.echo(f"Processed {count} notifications")
+        if not loop:
+            break
+        if count < current_app.config["NOTIFICATIONS_BATCH_SIZE"]:
+            threading.Event().wait(interval)
@@ -0,0 +1,145 @@
+import base64
+import json
+
+from flask import current_app, request, url_for
+
+from backend import db
+
+
+class InvalidPageArgs(Exception):
+    """Raised when the pagination query parameters cannot be used"""
+
+
+def encode_cursor(last_id):
+    """Encode the id of the last row of a page into an opaque cursor"""
+    payload = json.dumps({"id": last_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by `encode_cursor` back into the last id"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidPageArgs("Invalid cursor provided!")
+    if not isinstance(last_id, int):
+        raise InvalidPageArgs("Invalid cursor provided!")
+    return last_id
+
+
+def parse_limit(args, config, name="limit", default=None):
+    """Parse a page size query parameter, capped by API_MAX_PAGE_SIZE"""
+    if default is None:
+        default = config["API_PAGE_SIZE"]
+    try:
+        limit = int(args.get(name, default))
+    except ValueError:
+        raise InvalidPageArgs(f"{name} must be an integer!")
+    if limit < 1:
+        raise InvalidPageArgs(f"{name} must be greater than 0!")
+    return min(limit, config["API_MAX_PAGE_SIZE"])
+
+
+def parse_page_args(args, config):
+    """Parse the `limit` and `cursor` query parameters in `args`"""
+    limit = parse_limit(args, config)
+    cursor = args.get("cursor")
+    last_id = decode_cursor(cursor) if cursor else None
+    return limit, last_id
+
+
+def get_limit(name="limit", default=None):
+    """Read a page size query parameter of the current request"""
+    return parse_limit(request.args, current_app.config, name, default)
+
+
+def get_page_args():
+    """Read the `limit` and `cursor` query parameters of the current request"""
+    return parse_page_args(request.args, current_app.config)
+
+
+def paginate(query, id_column, limit, last_id=None):
+    """Fetch one page of `query` using keyset pagination on `id_column`
+
+    Every page is an index range scan on the primary key (`id > last_id`)
+    instead of an OFFSET, so the cost of a page does not depend on how deep
+    into the table it is. Returns the rows and the cursor of the next page,
+    which is None on the last page.
+    """
+    return split_page(keyset(query, id_column, limit, last_id).all(), limit)
+
+
+def keyset(query, id_column, limit, last_id=None):
+    """Restrict a query or select() to the page following `last_id`"""
+    if last_id is not None:
+        query = query.filter(id_column > last_id)
+    # fetch one extra row to find out if there is a next page
+    return query.order_by(id_column).limit(limit + 1)
+
+
+def split_page(rows, limit):
+    """Split the rows fetched by `keyset` into the page and the next cursor"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return rows, next_cursor
+
+
+def paginate_each(columns, group_column, id_column, group_ids, limit):
+    """Fetch the first page of every group in `group_ids` with a single query
+
+    Rows are numbered per group with a row_number() window and only the
+    first `limit` (plus one, to detect a next page) of each group are
+    returned, so loading the children of a whole page of parents costs one
+    query instead of one per parent. `columns` must include `group_column`
+    and `id_column`. Returns {group_id: (rows, next_cursor)}, with a cursor
+    that continues the group's own keyset pagination on `id_column`.
+    """
+    if not group_ids:
+        return {}
+    stmt = keyset_each(columns, group_column, id_column, group_ids, limit)
+    return split_pages(
+        db.session.execute(stmt), group_column, id_column, group_ids, limit
+    )
+
+
+def keyset_each(columns, group_column, id_column, group_ids, limit):
+    """The select() behind `paginate_each`"""
+    position = db.func.row_number().over(partition_by=group_column, order_by=id_column)
+    ranked = (
+        db.select(*columns, position.label("position"))
+        .where(group_column.in_(group_ids))
+        .subquery()
+    )
+    return (
+        db.select(*[ranked.c[column.key] for column in columns])
+        .where(ranked.c.position <= limit + 1)
+        .order_by(ranked.c[group_column.key], ranked.c[id_column.key])
+    )
+
+
+def split_pages(result, group_column, id_column, group_ids, limit):
+    """Group the rows fetched by `keyset_each` into pages, see `paginate_each`"""
+    pages = {group_id: ([], None) for group_id in group_ids}
+    for row in result:
+        rows, _ = pages[getattr(row, group_column.key)]
+        rows.append(row)
+    for group_id, (rows, _) in pages.items():
+        if len(rows) > limit:
+            del rows[limit:]
+            pages[group_id] = (rows, encode_cursor(getattr(rows[-1], id_column.key)))
+    return pages
+
+
+def add_page_headers(response, endpoint, next_cursor, **values):
+    """Attach the `Link` and `X-Next-Cursor` headers for the next page"""
+    if next_cursor:
+        args = request.args.to_dict()
+        args.update(values)
+        args["cursor"] = next_cursor
+        next_url = url_for(endpoint, _external=True, **args)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
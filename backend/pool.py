@@ -0,0 +1,130 @@
+"""Connection pool selection and metrics
+
+DB_POOL_CLASS picks between SQLAlchemy's QueuePool, replaced by the timed
+subclass below, and NullPool, which opens a connection per checkout and is
+meant for running behind an external pooler such as PgBouncer. The timed
+pool counts checkouts, the time spent waiting for a free connection and the
+checkouts that timed out, which is what shows whether DB_POOL_SIZE and
+DB_MAX_OVERFLOW are too small for the load of a worker.
+
+DB_STATEMENT_TIMEOUT is applied with a SET on every new connection rather
+than as a libpq startup option, which PgBouncer refuses unless it is listed
+in its ignore_startup_parameters.
+"""
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import NullPool, QueuePool
+
+# options that only make sense for a pool keeping connections around
+QUEUE_POOL_OPTIONS = ["pool_size", "max_overflow", "pool_timeout"]
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool measuring how long checkouts wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def stats(self):
+        return {
+            "pool": "queue",
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": round(self.wait_total, 6),
+            "wait_seconds_max": round(self.wait_max, 6),
+        }
+
+
+def configure_pool(config):
+    """Set the pool class of SQLALCHEMY_ENGINE_OPTIONS from DB_POOL_CLASS"""
+    options = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    pool_class = config.get("DB_POOL_CLASS", "queue")
+    if pool_class == "queue":
+        options["poolclass"] = TimedQueuePool
+    elif pool_class == "null":
+        options["poolclass"] = NullPool
+        for option in QUEUE_POOL_OPTIONS:
+            options.pop(option, None)
+    else:
+        raise ValueError(f"Unknown DB_POOL_CLASS {pool_class!r}")
+    config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def set_statement_timeout(engine, timeout):
+    """Cancel statements of `engine` running longer than `timeout` milliseconds"""
+    if not timeout:
+        return
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        # outside of a transaction, so the pool's rollback keeps the setting
+        autocommit = dbapi_connection.autocommit
+        dbapi_connection.autocommit = True
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {int(timeout)}")
+        cursor.close()
+        dbapi_connection.autocommit = autocommit
+
+
+def configure_engines(app):
+    """Apply the settings made per connection to every engine of `app`"""
+    # imported here as this module is loaded before the extensions exist
+    from backend import db, replica_router
+
+    timeout = app.config["DB_STATEMENT_TIMEOUT"]
+    with app.app_context():
+        for engine in db.engines.values():
+            set_statement_timeout(engine, timeout)
+        if replica_router.engine is not None:
+            set_statement_timeout(replica_router.engine, timeout)
+
+
+def dispose_engines(app):
+    """Drop the pooled connections `app` inherited from a parent process
+
+    Called in every gunicorn worker after the fork: sockets opened by the
+    master while preloading the app must not be shared between workers.
+    `close=False` leaves them open for the parent and only forgets them.
+    """
+    # imported here as this module is loaded before the extensions exist
+    from backend import db, replica_router
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        if replica_router.engine is not None:
+            replica_router.engine.dispose(close=False)
+
+
+def pool_stats(engine):
+    """Metrics of the pool of `engine` in this worker"""
+    pool = engine.pool
+    if isinstance(pool, TimedQueuePool):
+        return pool.stats()
+    return {"pool": type(pool).__name__, "status": pool.status()}
@@ -0,0 +1,120 @@
+"""Routing of API reads to a read replica
+
+With SQLALCHEMY_REPLICA_URI set (REPLICA_DATABASE_URL), the SELECTs
+of GET and HEAD requests to the API are sent to the replica while every
+write, every SELECT ... FOR UPDATE and everything outside of those requests
+goes to the primary. A client that just wrote gets a cookie sending its
+reads to the primary for DB_READ_YOUR_WRITES_WINDOW seconds, so it never
+reads a replica that has not caught up with its own write yet.
+
+If the replica cannot be connected to, reads fall back to the primary and
+the replica is left alone for DB_REPLICA_RETRY_INTERVAL seconds.
+
+Rows that go into the shared cache are read inside `read_primary()`: a
+lagging replica would otherwise put back a row a write just invalidated.
+
+The replica gets an engine of its own rather than a Flask-SQLAlchemy bind,
+which keeps it out of `db.create_all()` and the migrations.
+"""
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, exc
+from sqlalchemy.sql import Select
+
+PRIMARY_COOKIE = "read_primary_until"
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RoutingSession(Session):
+    """Session sending the reads of replica-safe requests to the replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _is_plain_read(clause):
+            if has_request_context() and g.get("use_replica"):
+                replica = self._replica()
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica(self):
+        state = current_app.extensions["replica"]
+        if state["down_until"] > time.monotonic():
+            return None
+        engine = state["engine"]
+        try:
+            # joins the session's transaction, so the query reuses it
+            self.connection(bind_arguments={"bind": engine})
+        except exc.OperationalError as e:
+            current_app.logger.warning(f"[REPLICA ERROR]: {e}")
+            retry = current_app.config["DB_REPLICA_RETRY_INTERVAL"]
+            state["down_until"] = time.monotonic() + retry
+            return None
+        return engine
+
+
+def _is_plain_read(clause):
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+class ReplicaRouter(object):
+    """Flask extension deciding which requests may read from the replica"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        url = app.config.get("SQLALCHEMY_REPLICA_URI")
+        app.extensions["replica"] = {"engine": None, "down_until": 0.0}
+        if url:
+            options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+            app.extensions["replica"]["engine"] = create_engine(url, **options)
+            app.before_request(self._before_request)
+            app.after_request(self._after_request)
+
+    def _before_request(self):
+        g.use_replica = (
+            request.method in READ_METHODS
+            and request.path.startswith("/api/")
+            and not self._wrote_recently()
+        )
+
+    def _wrote_recently(self):
+        try:
+            return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _after_request(self, response):
+        window = current_app.config["DB_READ_YOUR_WRITES_WINDOW"]
+        if request.method not in READ_METHODS and response.status_code < 400:
+            if window:
+                response.set_cookie(
+                    PRIMARY_COOKIE,
+                    str(time.time() + window),
+                    max_age=window,
+                    httponly=True,
+                    samesite="Lax",
+                )
+        return response
+
+    @contextmanager
+    def read_primary(self):
+        """Send the reads of the block to the primary"""
+        use_replica = g.get("use_replica", False)
+        g.use_replica = False
+        try:
+            yield
+        finally:
+            g.use_replica = use_replica
+
+    @property
+    def engine(self):
+        return current_app.extensions["replica"]["engine"]
+
+    def available(self):
+        state = current_app.extensions["replica"]
+        return state["down_until"] <= time.monotonic()
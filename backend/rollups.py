@@ -0,0 +1,238 @@
+"""Incremental maintenance of the order_daily_rollups table
+
+Every order belongs to the rollup row of its (day, customer_id, item). The
+ORM mapper events below keep that row up to date in the same transaction as
+the order itself: inserts are applied as deltas with an upsert, which stays
+correct under concurrent writers, while updates and deletes subtract their
+old values and recompute the day's min/max from the (customer_id, time)
+index. Writes made with Core statements, like the bulk order creation, call
+`add_orders` themselves. `flask rollups backfill` rebuilds any range from
+scratch, e.g. after loading orders with raw SQL.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from backend import db
+from backend.models import Order, OrderDailyRollup
+
+rollups_cli = AppGroup("rollups", help="Manage the daily order rollups.")
+
+orders = Order.__table__
+rollups = OrderDailyRollup.__table__
+ROLLUP_KEY = [rollups.c.day, rollups.c.customer_id, rollups.c.item]
+
+
+def _aggregate(rows):
+    """Group (time, customer_id, item, amount) rows by their rollup key"""
+    deltas = defaultdict(lambda: [0, 0, None, None])
+    for order_time, customer_id, item, amount in rows:
+        if order_time is None:
+            continue
+        delta = deltas[(order_time.date(), customer_id, item)]
+        delta[0] += 1
+        delta[1] += amount
+        delta[2] = amount if delta[2] is None else min(delta[2], amount)
+        delta[3] = amount if delta[3] is None else max(delta[3], amount)
+    return deltas
+
+
+def _key_matches(day, customer_id, item):
+    return db.and_(
+        rollups.c.day == day,
+        rollups.c.customer_id == customer_id,
+        rollups.c.item == item,
+    )
+
+
+def add_orders(connection, rows):
+    """Add (time, customer_id, item, amount) rows to their rollups"""
+    deltas = _aggregate(rows)
+    if not deltas:
+        return
+    stmt = pg_insert(rollups).values(
+        [
+            {
+                "day": day,
+                "customer_id": customer_id,
+                "item": item,
+                "count": count,
+                "total": total,
+                "min_amount": min_amount,
+                "max_amount": max_amount,
+            }
+            for (day, customer_id, item), (
+                count,
+                total,
+                min_amount,
+                max_amount,
+            ) in deltas.items()
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=ROLLUP_KEY,
+        set_={
+            "count": rollups.c.count + stmt.excluded.count,
+            "total": rollups.c.total + stmt.excluded.total,
+            "min_amount": db.func.least(rollups.c.min_amount, stmt.excluded.min_amount),
+            "max_amount": db.func.greatest(
+                rollups.c.max_amount, stmt.excluded.max_amount
+            ),
+        },
+    )
+    connection.execute(stmt)
+
+
+def remove_orders(connection, rows):
+    """Take (time, customer_id, item, amount) rows out of their rollups
+
+    Must run once the orders are gone (or changed) in the orders table, as
+    the min/max of the affected days are recomputed from it.
+    """
+    for (day, customer_id, item), (count, total, _, _) in _aggregate(rows).items():
+        start = datetime.combine(day, time.min)
+        same_day = db.and_(
+            orders.c.customer_id == customer_id,
+            orders.c.item == item,
+            orders.c.time >= start,
+            orders.c.time < start + timedelta(days=1),
+        )
+        key = _key_matches(day, customer_id, item)
+        # the day may have no orders left, the row is then deleted below
+        min_amount = db.select(db.func.min(orders.c.amount)).where(same_day)
+        max_amount = db.select(db.func.max(orders.c.amount)).where(same_day)
+        connection.execute(
+            db.update(rollups)
+            .where(key)
+            .values(
+                count=rollups.c.count - count,
+                total=rollups.c.total - total,
+                min_amount=db.func.coalesce(
+                    min_amount.scalar_subquery(), rollups.c.min_amount
+                ),
+                max_amount=db.func.coalesce(
+                    max_amount.scalar_subquery(), rollups.c.max_amount
+                ),
+            )
+        )
+        connection.execute(db.delete(rollups).where(key, rollups.c.count <= 0))
+
+
+def _values(order):
+    return [(order.time, order.customer_id, order.item, order.amount)]
+
+
+ROLLUP_ATTRIBUTES = ["time", "customer_id", "item", "amount"]
+
+
+def _load_old_value(order, value, oldvalue, initiator):
+    pass
+
+
+# active history loads the old value of an expired attribute before it is
+# replaced, otherwise updating an order right after a commit leaves no trace
+# of the rollup it has to leave
+for attr in ROLLUP_ATTRIBUTES:
+    event.listen(getattr(Order, attr), "set", _load_old_value, active_history=True)
+
+
+def _old_values(order):
+    state = inspect(order)
+    old = []
+    for attr in ROLLUP_ATTRIBUTES:
+        history = state.attrs[attr].history
+        old.append(history.deleted[0] if history.deleted else getattr(order, attr))
+    return [tuple(old)]
+
+
+@event.listens_for(Order, "after_insert")
+def order_inserted(mapper, connection, order):
+    add_orders(connection, _values(order))
+
+
+@event.listens_for(Order, "after_update")
+def order_updated(mapper, connection, order):
+    old, new = _old_values(order), _values(order)
+    if old != new:
+        remove_orders(connection, old)
+        add_orders(connection, new)
+
+
+@event.listens_for(Order, "after_delete")
+def order_deleted(mapper, connection, order):
+    remove_orders(connection, _values(order))
+
+
+def backfill(since=None, until=None):
+    """Rebuild the rollups of the days in [since, until) from the orders table"""
+    day = db.cast(orders.c.time, db.Date)
+    rollup_range, order_range = [], []
+    if since is not None:
+        rollup_range.append(rollups.c.day >= since)
+        order_range.append(orders.c.time >= datetime.combine(since, time.min))
+    if until is not None:
+        rollup_range.append(rollups.c.day < until)
+        order_range.append(orders.c.time < datetime.combine(until, time.min))
+
+    db.session.execute(db.delete(rollups).where(*rollup_range))
+    aggregates = (
+        db.select(
+            day,
+            orders.c.customer_id,
+            orders.c.item,
+            db.func.count(),
+            db.func.sum(orders.c.amount),
+            db.func.min(orders.c.amount),
+            db.func.max(orders.c.amount),
+        )
+        .where(orders.c.time.isnot(None), *order_range)
+        .group_by(day, orders.c.customer_id, orders.c.item)
+    )
+    result = db.session.execute(
+        db.insert(rollups).from_select(
+            [
+                "day",
+                "customer_id",
+                "item",
+                "count",
+                "total",
+                "min_amount",
+                "max_amount",
+            ],
+            aggregates,
+        )
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+@rollups_cli.command("backfill")
+@click.option("--since", type=click.DateTime(["%Y-%m-%d"]), help="First day.")
+@click.option("--until", type=click.DateTime(["%Y-%m-%d"]), help="Day after the last.")
+@click.option("--chunk-days", default=31, show_default=True, help="Days per commit.")
+def backfill_command(since, until, chunk_days):
+    """Rebuild the daily rollups from the orders table."""
+    since = since.date() if since else None
+    until = until.date() if until else None
+    if since is None or until is None:
+        first, last = db.session.execute(
+            db.select(db.func.min(orders.c.time), db.func.max(orders.c.time))
+        ).one()
+        if first is None:
+            click.echo("No orders to roll up")
+            return
+        since = since or first.date()
+        until = until or last.date() + timedelta(days=1)
+
+    # one transaction per chunk keeps the locks and the WAL of a run bounded
+    total = 0
+    start = since
+    while start < until:
+        end = min(start + timedelta(days=chunk_days), until)
+        total += backfill(start, end)
+        start = end
+    click.echo(f"Rebuilt {total} rollups from {since} to {until}")
@@ -1,5 +1,5 @@
 import json
-import requests
+from datetime import datetime
 
 from flask import (
     render_template,
@@ -13,34 +13,117 @@ from flask import (
     flash,
     Blueprint,
     current_app,
+    Response,
+    stream_with_context,
 )
 
-from backend import db
+from backend import (
+    db,
+    cache,
+    services,
+    analytics,
+    notification_queue,
+    replica_router,
+)
+from backend.auth import get_oauth_client
+from backend.idempotency import idempotent
 from backend.models import Customer, Order
 from backend.forms import UpdateCustomerForm, MakeOrderForm
+from backend.filters import InvalidFilter, order_filters
+from backend.conditional import (
+    order_etag,
+    is_modified,
+    not_modified_response,
+    conditional_response,
+)
+from backend.pool import pool_stats
+from backend.serializers import (
+    CUSTOMER_COLUMNS,
+    ORDER_COLUMNS,
+    InvalidFields,
+    InvalidInclude,
+    customer_to_dict,
+    get_fields,
+    get_include,
+    order_to_dict,
+    project,
+    select_columns,
+)
+from backend.pagination import (
+    InvalidPageArgs,
+    get_limit,
+    get_page_args,
+    paginate,
+    paginate_each,
+    add_page_headers,
+)
 
 bp = Blueprint("main", __name__)
 
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def _get_customer_id(session_info):
+    """Id of the logged in customer, resolved at login and kept in the session
+
+    Sessions started before the id was stored in them get it on their next
+    page view.
+    """
+    customer_id = session.get("customer_id")
+    if customer_id is None:
+        customer_id = _login_customer(session_info)
+    return customer_id
+
+
+def _login_customer(session_info):
+    """Get or create the customer of a Google profile and remember its id"""
+    name = session_info["userinfo"]["name"]
+    email = session_info["userinfo"]["email"]
+    contact = "NULL"  # default if we cannot extract the contact from Google
+    if "phoneNumbers" in session_info["personData"]:
+        # attempt to extract contact from Google
+        contact = session_info["personData"]["phoneNumbers"][0]["canonicalForm"]
+        contact = contact.split("+")[-1]
+
+    customer_id = services.get_or_create_customer_id(name, email, contact)
+    session["customer_id"] = customer_id
+    return customer_id
+
+
+def _session_profile(token, person_data):
+    """The parts of the Google token and profile the pages use
+
+    Kept in the session instead of the whole token, whose access and ID
+    tokens are never used again after the login.
+    """
+    profile = {
+        "userinfo": {
+            "name": token["userinfo"]["name"],
+            "email": token["userinfo"]["email"],
+        },
+        "personData": {},
+    }
+    if person_data.get("phoneNumbers"):
+        phone_number = person_data["phoneNumbers"][0]["canonicalForm"]
+        profile["personData"]["phoneNumbers"] = [{"canonicalForm": phone_number}]
+    return profile
+
+
+def _get_customer(session_info):
+    customer = db.session.get(Customer, _get_customer_id(session_info))
+    if customer is None:
+        # deleted since the login, the profile creates it again
+        customer = db.session.get(Customer, _login_customer(session_info))
+    return customer
+
 
 @bp.route("/", methods=["GET", "POST"])
 @bp.route("/index", methods=["GET", "POST"])
 def index():
     sesison_info = session.get("user")
     if sesison_info:  # logged in users.
-        name = sesison_info["userinfo"]["name"]
-        email = sesison_info["userinfo"]["email"]
-        contact = "NULL"  # default if we cannot extract the contact from Google
-        if "phoneNumbers" in sesison_info["personData"]:
-            # attempt to extract contact from Google
-            contact = sesison_info["personData"]["phoneNumbers"][0]["canonicalForm"]
-            contact = contact.split("+")[-1]
-
         # database logic
-        customer = Customer.query.filter_by(email=email).first()
-        if not customer:
-            customer = Customer(name=name, email=email, contact=contact)
-            db.session.add(customer)
-            db.session.commit()
+        customer = _get_customer(sesison_info)
 
         # update customer
         form = UpdateCustomerForm()
@@ -50,17 +133,11 @@ def index():
             email = form.email.data
             contact = form.contact.data
 
-            # send PUT request to our API to update the data
             data = {"name": name, "email": email, "contact": contact}
-            headers = {"Content-Type": "application/json"}
-            response = requests.put(
-                f'{url_for("main.update_customer", customer_id=customer.id, _external=True)}',
-                data=json.dumps(data),
-                headers=headers,
-            )
-            if response.status_code == 201:
+            try:
+                services.update_customer(customer.id, data)
                 flash("Records updated successfully")
-            else:
+            except services.ServiceError:
                 flash("Failed to update customer", category="danger")
 
             return redirect(url_for("main.index"))
@@ -78,23 +155,27 @@ def index():
 # login + logout endpoints
 @bp.route("/login")
 def login():
-    return current_app.orders_api_auth.authorize_redirect(
+    return get_oauth_client().authorize_redirect(
         redirect_uri=url_for("main.google_callback", _external=True)
     )
 
 
 @bp.route("/google-login")
 def google_callback():
-    token = current_app.orders_api_auth.authorize_access_token()
+    client = get_oauth_client()
+    token = client.authorize_access_token()
     personDataUrl = (
         "https://people.googleapis.com/v1/people/me?personFields=phoneNumbers"
     )
-    personData = requests.get(
-        personDataUrl, headers={"Authorization": f"Bearer {token['access_token']}"}
-    ).json()
+    personData = client.get(personDataUrl, token=token).json()
 
-    token["personData"] = personData  # contacts from Google are located in personData
-    session["user"] = token
+    # a new session id at login, so one planted before it is worth nothing
+    if hasattr(session, "regenerate"):
+        session.regenerate()
+    # contacts from Google are located in personData
+    session["user"] = _session_profile(token, personData)
+    # resolved once here, page views then read the id from the session
+    _login_customer(session["user"])
 
     return redirect(url_for("main.index"))
 
@@ -102,6 +183,7 @@ def google_callback():
 @bp.route("/logout")
 def logout():
     session.pop("user")
+    session.pop("customer_id", None)
     return redirect(url_for("main.index"))
 
 
@@ -109,9 +191,8 @@ def logout():
 def orders():
     sesison_info = session.get("user")
     if sesison_info:
-        email = sesison_info["userinfo"]["email"]
-        customer = Customer.query.filter_by(email=email).first()
-        orders = Order.query.filter_by(customer_id=customer.id).all()
+        customer_id = _get_customer_id(sesison_info)
+        orders = Order.query.filter_by(customer_id=customer_id).all()
 
         form = MakeOrderForm()
         if form.validate_on_submit():
@@ -119,28 +200,20 @@ def orders():
             item = form.item.data
             amount = round(float(form.amount.data), 2)
 
-            # send PUT request to our API to update the data
+            # the confirmation SMS needs the customer's name and contact
+            customer = _get_customer(sesison_info)
             data = {"customer_id": customer.id, "item": item, "amount": amount}
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(
-                f'{url_for("main.create_order", _external=True)}',
-                data=json.dumps(data),
-                headers=headers,
-            )
-            if response.status_code == 201:
-                flash("Order made successfully")
-                # try and send the order confirmation SMS
-                try:
-                    message = f"Thank you {customer.name} for making an order of {item} for amount Ksh.{amount}"
-                    contact = f"+{customer.contact}"
-                    sender = current_app.config.get("AFRICASTALKING_SENDER_ID")
-                    response = current_app.sms_service.send(message, [contact], sender)
-                    print(f"[MESSAGE RESPONSE]: {response}")
-                except Exception as e:
-                    print(f"[MESSAGE ERROR]: {e}")
-
-            else:
+            try:
+                services.create_order(data)
+            except services.ServiceError:
                 flash("Failed to make order", category="danger")
+            else:
+                flash("Order made successfully")
+                # the order confirmation SMS is sent by the notification worker
+                message = f"Thank you {customer.name} for making an order of {item} for amount Ksh.{amount}"
+                contact = f"+{customer.contact}"
+                sender = current_app.config.get("AFRICASTALKING_SENDER_ID")
+                notification_queue.enqueue(contact, message, sender)
 
             return redirect(url_for("main.orders"))
 
@@ -159,19 +232,84 @@ def orders():
 # Customer Endpoints
 @bp.route("/api/v1/customers", methods=["GET"])
 def get_customers():
-    """Get all customers present in the database
+    """Get the customers present in the database, one page at a time
     Specifications
     ---
+    parameters:
+      - name: limit
+        in: query
+        type: int
+        required: false
+        description: Number of customers per page (capped by API_MAX_PAGE_SIZE)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Opaque cursor taken from the previous page's X-Next-Cursor header
+      - name: include
+        in: query
+        type: string
+        required: false
+        description: Set to orders to embed the first orders of every customer
+      - name: orders_limit
+        in: query
+        type: int
+        required: false
+        description: Number of orders embedded per customer (defaults to API_NESTED_PAGE_SIZE). An orders_next URL points to the rest
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated fields to return, out of id, name, email and contact
     responses:
-      201:
-        description: Data for all the customers
+      200:
+        description: Data for one page of customers. The Link and X-Next-Cursor headers point to the next page
+      304:
+        description: The page matches the ETag sent in If-None-Match
+      400:
+        description: Invalid limit, cursor, include or fields
     """
-    customers = Customer.query.all()
-    customer_list = [
-        {"id": c.id, "name": c.name, "email": c.email, "contact": c.contact}
-        for c in customers
-    ]
-    return jsonify(customer_list), 201
+    try:
+        limit, last_id = get_page_args()
+        fields = get_fields(request.args, CUSTOMER_COLUMNS)
+        include = get_include(request.args, ["orders"])
+        if "orders" in include:
+            orders_limit = get_limit(
+                "orders_limit", current_app.config["API_NESTED_PAGE_SIZE"]
+            )
+    except (InvalidPageArgs, InvalidFields, InvalidInclude) as e:
+        return jsonify({"error": str(e)}), 400
+    query = db.session.query(*select_columns(CUSTOMER_COLUMNS, fields, [Customer.id]))
+    customers, next_cursor = paginate(query, Customer.id, limit, last_id)
+    customer_list = [project(c, fields) for c in customers]
+    if "orders" in include:
+        _embed_orders(customers, customer_list, orders_limit)
+    response = jsonify(customer_list)
+    add_page_headers(response, "main.get_customers", next_cursor)
+    return conditional_response(response)
+
+
+def _embed_orders(customers, customer_list, limit):
+    """Add the first `limit` orders of every customer with a single query"""
+    pages = paginate_each(
+        ORDER_COLUMNS,
+        Order.customer_id,
+        Order.id,
+        [c.id for c in customers],
+        limit,
+    )
+    for row, customer in zip(customers, customer_list):
+        orders, next_cursor = pages[row.id]
+        customer["orders"] = [order_to_dict(o) for o in orders]
+        customer["orders_next"] = None
+        if next_cursor:
+            customer["orders_next"] = url_for(
+                "main.get_customer_orders",
+                customer_id=row.id,
+                limit=limit,
+                cursor=next_cursor,
+                _external=True,
+            )
 
 
 @bp.route("/api/v1/customers/<int:customer_id>", methods=["GET"])
@@ -184,26 +322,107 @@ def get_customer(customer_id):
         in: customer id
         type: int
         required: true
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated fields to return, out of id, name, email and contact
     responses:
       200:
         description: Data for the customer requested
+      304:
+        description: The customer matches the ETag sent in If-None-Match
+      400:
+        description: Invalid fields
       404:
         description: Customer does not exist in the database
     """
-    customer = Customer.query.get(customer_id)
-    if customer:
-        return (
-            jsonify(
-                {
-                    "id": customer.id,
-                    "name": customer.name,
-                    "email": customer.email,
-                    "contact": customer.contact,
-                }
-            ),
-            200,
-        )
-    abort(404)
+    fields = get_fields(request.args, CUSTOMER_COLUMNS)
+    key = f"customer:{customer_id}"
+    data = cache.get(key)
+    if data is None:
+        # the cache is shared, so it is filled from the primary only
+        with replica_router.read_primary():
+            customer = Customer.query.get(customer_id)
+        if not customer:
+            abort(404)
+        data = customer_to_dict(customer)
+        cache.set(key, data)
+    return conditional_response(jsonify(project(data, fields)))
+
+
+@bp.route("/api/v1/customers/<int:customer_id>/orders", methods=["GET"])
+def get_customer_orders(customer_id):
+    """Get the orders of a customer, one page at a time
+    Specifications
+    ---
+    parameters:
+      - name: customer_id
+        in: path
+        type: int
+        required: true
+      - name: limit
+        in: query
+        type: int
+        required: false
+        description: Number of orders per page (capped by API_MAX_PAGE_SIZE)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Opaque cursor taken from the previous page's X-Next-Cursor header
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Only orders made at or after this ISO-8601 date/datetime
+      - name: until
+        in: query
+        type: string
+        required: false
+        description: Only orders made before this ISO-8601 date/datetime
+      - name: item
+        in: query
+        type: string
+        required: false
+        description: Only orders whose item starts with this prefix
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated fields to return, out of id, customer_id, item, amount and time. Only those columns are read
+    responses:
+      200:
+        description: Data for one page of the customer's orders. The Link and X-Next-Cursor headers point to the next page
+      304:
+        description: The page matches the ETag sent in If-None-Match
+      400:
+        description: Invalid limit, cursor, filter or fields
+      404:
+        description: Customer does not exist in the database
+    """
+    try:
+        criteria = order_filters(request.args)
+        fields = get_fields(request.args, ORDER_COLUMNS)
+        limit, last_id = get_page_args()
+    except (InvalidFilter, InvalidPageArgs, InvalidFields) as e:
+        return jsonify({"error": str(e)}), 400
+    exists = db.session.execute(
+        db.select(Customer.id).where(Customer.id == customer_id)
+    ).first()
+    if not exists:
+        abort(404)
+    columns = select_columns(ORDER_COLUMNS, fields, [Order.id])
+    query = db.session.query(*columns).filter(
+        Order.customer_id == customer_id, *criteria
+    )
+    orders, next_cursor = paginate(query, Order.id, limit, last_id)
+    order_list = [project(o, fields) for o in orders]
+    response = jsonify(order_list)
+    add_page_headers(
+        response, "main.get_customer_orders", next_cursor, customer_id=customer_id
+    )
+    return conditional_response(response)
 
 
 @bp.route("/api/v1/customers", methods=["POST"])
@@ -222,35 +441,35 @@ def create_customer():
         description: Data for the customer created
       400:
         description: Missing some fields in the data you provided
+      409:
+        description: A customer with that email already exists
     """
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "No data provided!"}), 400
-    required_fields = ["name", "email", "contact"]
-    for field in required_fields:
-        if field not in data:
-            return (
-                jsonify({"error": f"Missing {field} field in the data provided!"}),
-                400,
-            )
-    customer = {f"{field}": data.get(f"{field}") for field in required_fields}
-    new_customer = Customer(
-        name=customer["name"], email=customer["email"], contact=customer["contact"]
-    )
-    db.session.add(new_customer)
-    db.session.commit()
-
-    return (
-        jsonify(
-            {
-                "id": new_customer.id,
-                "name": new_customer.name,
-                "email": new_customer.email,
-                "contact": new_customer.contact,
-            }
-        ),
-        201,
-    )
+    customer = services.create_customer(request.get_json())
+    return jsonify(customer_to_dict(customer)), 201
+
+
+@bp.route("/api/v1/customers/bulk", methods=["POST"])
+def upsert_customers_bulk():
+    """Create or update many customers, matched on their email
+    Specifications
+    ---
+    parameters:
+      - name: data
+        description: a JSON array of customers, or one customer per line with Content-Type application/x-ndjson
+        in: data
+        type: json
+        required: true
+    responses:
+      200:
+        description: Number of customers created and updated
+      400:
+        description: Errors for every invalid customer. Nothing is written
+      413:
+        description: More customers than BULK_MAX_BATCH_SIZE were sent
+    """
+    rows, errors = _get_bulk_rows("customers")
+    created, updated = services.upsert_customers_bulk(rows, errors)
+    return jsonify({"created": created, "updated": updated}), 200
 
 
 @bp.route("/api/v1/customers/<int:customer_id>", methods=["PUT"])
@@ -274,35 +493,11 @@ def update_customer(customer_id):
         description: Data for the customer updated
       400:
         description:  Missing some fields in the data you provided
+      409:
+        description: Another customer already has that email
     """
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "No data provided!"}), 400
-    required_fields = ["name", "email", "contact"]
-    for field in required_fields:
-        if field not in data:
-            return (
-                jsonify({"error": f"Missing {field} field in the data provided!"}),
-                400,
-            )
-    customer = Customer.query.get(customer_id)
-    if customer:
-        customer.name = data["name"]
-        customer.email = data["email"]
-        customer.contact = data["contact"]
-        db.session.commit()
-        return (
-            jsonify(
-                {
-                    "id": customer.id,
-                    "name": customer.name,
-                    "email": customer.email,
-                    "contact": customer.contact,
-                }
-            ),
-            201,
-        )
-    return jsonify({"message": "Customer not found"}), 404
+    customer = services.update_customer(customer_id, request.get_json())
+    return jsonify(customer_to_dict(customer)), 201
 
 
 @bp.route("/api/v1/customers/<int:customer_id>", methods=["DELETE"])
@@ -322,36 +517,126 @@ def delete_customer(customer_id):
       400:
         description: Customer not found
     """
-    customer = Customer.query.get(customer_id)
-    if customer:
-        db.session.delete(customer)
-        db.session.commit()
-        return jsonify({"message": "Customer deleted"}), 201
-    return jsonify({"message": "Customer not found"}), 404
+    services.delete_customer(customer_id)
+    return jsonify({"message": "Customer deleted"}), 201
 
 
 # Order Endpoints
 @bp.route("/api/v1/orders", methods=["GET"])
 def get_orders():
-    """Get all customers present in the database
+    """Get the orders present in the database, one page at a time
     Specifications
     ---
+    parameters:
+      - name: limit
+        in: query
+        type: int
+        required: false
+        description: Number of orders per page (capped by API_MAX_PAGE_SIZE)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Opaque cursor taken from the previous page's X-Next-Cursor header
+      - name: stream
+        in: query
+        type: int
+        required: false
+        description: Set to 1 (or send Accept application/x-ndjson) to stream every matching order as NDJSON
+      - name: customer_id
+        in: query
+        type: int
+        required: false
+        description: Only orders made by this customer
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Only orders made at or after this ISO-8601 date/datetime
+      - name: until
+        in: query
+        type: string
+        required: false
+        description: Only orders made before this ISO-8601 date/datetime
+      - name: min_amount
+        in: query
+        type: number
+        required: false
+        description: Only orders with at least this amount
+      - name: max_amount
+        in: query
+        type: number
+        required: false
+        description: Only orders with at most this amount
+      - name: item
+        in: query
+        type: string
+        required: false
+        description: Only orders whose item starts with this prefix
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated fields to return, out of id, customer_id, item, amount and time. Only those columns are read
     responses:
-      201:
-        description: Data for all the orders
+      200:
+        description: Data for one page of orders. The Link and X-Next-Cursor headers point to the next page
+      304:
+        description: The page matches the ETag sent in If-None-Match
+      400:
+        description: Invalid limit, cursor, filter or fields
     """
-    orders = Order.query.all()
-    order_list = [
-        {
-            "id": o.id,
-            "customer_id": o.customer_id,
-            "item": o.item,
-            "amount": float(o.amount),
-            "time": o.time,
-        }
-        for o in orders
-    ]
-    return jsonify(order_list), 201
+    try:
+        criteria = order_filters(request.args)
+        fields = get_fields(request.args, ORDER_COLUMNS)
+        if _wants_stream():
+            return stream_orders(criteria, fields)
+        limit, last_id = get_page_args()
+    except (InvalidFilter, InvalidPageArgs, InvalidFields) as e:
+        return jsonify({"error": str(e)}), 400
+    columns = select_columns(ORDER_COLUMNS, fields, [Order.id])
+    query = db.session.query(*columns).filter(*criteria)
+    orders, next_cursor = paginate(query, Order.id, limit, last_id)
+    order_list = [project(o, fields) for o in orders]
+    response = jsonify(order_list)
+    add_page_headers(response, "main.get_orders", next_cursor)
+    return conditional_response(response)
+
+
+def _wants_stream():
+    if request.args.get("stream") in ("1", "true"):
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def stream_orders(criteria, fields):
+    """Stream `fields` of every order matching `criteria` as newline delimited JSON
+
+    The rows are read through a server-side cursor in chunks of
+    STREAM_CHUNK_SIZE and written out as they arrive, so neither the ORM
+    objects nor the whole JSON document are ever held in memory.
+    """
+    chunk_size = current_app.config["STREAM_CHUNK_SIZE"]
+    query = (
+        db.session.query(*select_columns(ORDER_COLUMNS, fields, [Order.id]))
+        .filter(*criteria)
+        .order_by(Order.id)
+        .execution_options(yield_per=chunk_size)
+    )
+
+    def generate():
+        dumps = current_app.json.dumps
+        lines = []
+        for o in query:
+            lines.append(dumps(project(o, fields)) + "\n")
+            if len(lines) == chunk_size:
+                yield "".join(lines)
+                lines = []
+        if lines:
+            yield "".join(lines)
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
 
 
 @bp.route("/api/v1/orders/<int:order_id>", methods=["GET"])
@@ -364,30 +649,53 @@ def get_order(order_id):
         in: order id
         type: int
         required: true
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated fields to return, out of id, customer_id, item, amount and time
     responses:
       200:
-        description: Data for the order requested
+        description: Data for the order requested, with ETag and Last-Modified headers
+      304:
+        description: The order has not changed since If-None-Match / If-Modified-Since
+      400:
+        description: Invalid fields
       404:
         description: Order does not exist in the database
     """
-    order = Order.query.get(order_id)
-    if order:
-        return (
-            jsonify(
-                {
-                    "id": order.id,
-                    "customer_id": order.customer_id,
-                    "item": order.item,
-                    "amount": float(order.amount),
-                    "time": order.time,
-                }
-            ),
-            200,
-        )
-    return abort(404)
+    fields = get_fields(request.args, ORDER_COLUMNS)
+    key = f"order:{order_id}"
+    cached = cache.get(key)
+    if cached is None:
+        if request.if_none_match or request.if_modified_since:
+            # answer the conditional request from the updated column alone
+            row = db.session.execute(
+                db.select(Order.updated).where(Order.id == order_id)
+            ).first()
+            if row is None:
+                abort(404)
+            etag = order_etag(order_id, row.updated)
+            if not is_modified(etag, row.updated):
+                return not_modified_response(etag, row.updated)
+        # the cache is shared, so it is filled from the primary only
+        with replica_router.read_primary():
+            order = Order.query.get(order_id)
+        if not order:
+            abort(404)
+        cached = {
+            "order": order_to_dict(order),
+            "updated": order.updated.isoformat() if order.updated else None,
+        }
+        cache.set(key, cached)
+    updated = cached["updated"]
+    updated = datetime.fromisoformat(updated) if updated else None
+    response = jsonify(project(cached["order"], fields))
+    return conditional_response(response, order_etag(order_id, updated), updated)
 
 
 @bp.route("/api/v1/orders", methods=["POST"])
+@idempotent
 def create_order():
     """Create an order in the database
     Specifications
@@ -404,30 +712,60 @@ def create_order():
       400:
         description: Missing some fields in the data you provided
     """
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "No data provided!"}), 400
-    if "customer_id" not in data or "item" not in data or "amount" not in data:
-        return jsonify({"error": "Missing name field in the data provided!"}), 400
-    new_order = Order(
-        customer_id=data["customer_id"],
-        item=data["item"],
-        amount=data["amount"],
-    )
-    db.session.add(new_order)
-    db.session.commit()
-    return (
-        jsonify(
-            {
-                "id": new_order.id,
-                "customer_id": new_order.customer_id,
-                "item": new_order.item,
-                "amount": float(new_order.amount),
-                "time": new_order.time,
-            }
-        ),
-        201,
-    )
+    order = services.create_order(request.get_json())
+    return jsonify(order_to_dict(order)), 201
+
+
+@bp.route("/api/v1/orders/bulk", methods=["POST"])
+@idempotent
+def create_orders_bulk():
+    """Create many orders in a single transaction
+    Specifications
+    ---
+    parameters:
+      - name: data
+        description: a JSON array of orders, or one order per line with Content-Type application/x-ndjson
+        in: data
+        type: json
+        required: true
+    responses:
+      201:
+        description: Ids of the orders created, in the order they were sent
+      400:
+        description: Errors for every invalid order. Nothing is created
+      413:
+        description: More orders than BULK_MAX_BATCH_SIZE were sent
+    """
+    rows, errors = _get_bulk_rows("orders")
+    ids = services.create_orders_bulk(rows, errors)
+    return jsonify({"created": len(ids), "ids": ids}), 201
+
+
+def _get_bulk_rows(name):
+    """Read the rows of a bulk request from a JSON array or an NDJSON body"""
+    if request.mimetype == NDJSON_MIMETYPE:
+        return _parse_ndjson(request.get_data(as_text=True))
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list):
+        raise services.ServiceError(f"Expected a JSON array of {name}!")
+    return rows, []
+
+
+def _parse_ndjson(body):
+    """Parse one JSON document per non-empty line
+
+    Returns the parsed rows, with None in place of the lines that could not
+    be parsed, and the errors for those lines.
+    """
+    rows, errors = [], []
+    lines = [line for line in body.splitlines() if line.strip()]
+    for index, line in enumerate(lines):
+        try:
+            rows.append(json.loads(line))
+        except ValueError:
+            rows.append(None)
+            errors.append({"index": index, "error": "Invalid JSON"})
+    return rows, errors
 
 
 @bp.route("/api/v1/orders/<int:order_id>", methods=["PUT"])
@@ -452,28 +790,11 @@ def update_order(order_id):
       400:
         description:  Missing some fields in the data you provided
     """
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "No data provided!"}), 400
-    order = Order.query.get(order_id)
-    if order:
-        order.customer_id = data["customer_id"]
-        order.item = data["item"]
-        order.amount = data["amount"]
-        db.session.commit()
-        return (
-            jsonify(
-                {
-                    "id": order.id,
-                    "customer_id": order.customer_id,
-                    "item": order.item,
-                    "amount": float(order.amount),
-                    "time": order.updated,
-                }
-            ),
-            201,
-        )
-    return jsonify({"message": "Order not found"}), 404
+    order = services.update_order(order_id, request.get_json())
+    data = order_to_dict(order)
+    # this endpoint has always answered with the time of the update
+    data["time"] = order.updated
+    return jsonify(data), 201
 
 
 @bp.route("/api/v1/orders/<int:order_id>", methods=["DELETE"])
@@ -493,15 +814,238 @@ def delete_order(order_id):
       400:
         description: Order not found
     """
-    order = Order.query.get(order_id)
-    if order:
-        db.session.delete(order)
-        db.session.commit()
-        return jsonify({"message": "Order deleted"}), 200
-    return jsonify({"message": "Order not found"}), 404
+    services.delete_order(order_id)
+    return jsonify({"message": "Order deleted"}), 200
+
+
+# Analytics Endpoints
+@bp.route("/api/v1/stats/summary", methods=["GET"])
+def get_stats_summary():
+    """Get the count, total, average, min and max amount of the orders
+    Specifications
+    ---
+    parameters:
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Only orders made at or after this ISO-8601 date/datetime
+      - name: until
+        in: query
+        type: string
+        required: false
+        description: Only orders made before this ISO-8601 date/datetime
+      - name: customer_id
+        in: query
+        type: int
+        required: false
+        description: Only orders made by this customer
+      - name: item
+        in: query
+        type: string
+        required: false
+        description: Only orders whose item starts with this prefix
+      - name: source
+        in: query
+        type: string
+        required: false
+        description: Set to raw to skip the daily rollups and aggregate the orders table
+    responses:
+      200:
+        description: Aggregates over the matching orders
+      400:
+        description: Invalid filter
+    """
+    return conditional_response(jsonify(analytics.summary(request.args)))
+
+
+@bp.route("/api/v1/stats/customers", methods=["GET"])
+def get_stats_customers():
+    """Get the order aggregates of each customer, biggest total first
+    Specifications
+    ---
+    parameters:
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Only orders made at or after this ISO-8601 date/datetime
+      - name: until
+        in: query
+        type: string
+        required: false
+        description: Only orders made before this ISO-8601 date/datetime
+      - name: customer_id
+        in: query
+        type: int
+        required: false
+        description: Only orders made by this customer
+      - name: item
+        in: query
+        type: string
+        required: false
+        description: Only orders whose item starts with this prefix
+      - name: source
+        in: query
+        type: string
+        required: false
+        description: Set to raw to skip the daily rollups and aggregate the orders table
+      - name: limit
+        in: query
+        type: int
+        required: false
+        description: Number of customers returned (capped by API_MAX_PAGE_SIZE)
+    responses:
+      200:
+        description: Aggregates per customer_id
+      400:
+        description: Invalid filter or limit
+    """
+    return _grouped_stats("customer")
+
+
+@bp.route("/api/v1/stats/items", methods=["GET"])
+def get_stats_items():
+    """Get the order aggregates of each item, biggest total first
+    Specifications
+    ---
+    parameters:
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Only orders made at or after this ISO-8601 date/datetime
+      - name: until
+        in: query
+        type: string
+        required: false
+        description: Only orders made before this ISO-8601 date/datetime
+      - name: customer_id
+        in: query
+        type: int
+        required: false
+        description: Only orders made by this customer
+      - name: item
+        in: query
+        type: string
+        required: false
+        description: Only orders whose item starts with this prefix
+      - name: source
+        in: query
+        type: string
+        required: false
+        description: Set to raw to skip the daily rollups and aggregate the orders table
+      - name: limit
+        in: query
+        type: int
+        required: false
+        description: Number of items returned (capped by API_MAX_PAGE_SIZE)
+    responses:
+      200:
+        description: Aggregates per item
+      400:
+        description: Invalid filter or limit
+    """
+    return _grouped_stats("item")
+
+
+@bp.route("/api/v1/stats/timeseries", methods=["GET"])
+def get_stats_timeseries():
+    """Get the order aggregates per day, week or month
+    Specifications
+    ---
+    parameters:
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Only orders made at or after this ISO-8601 date/datetime
+      - name: until
+        in: query
+        type: string
+        required: false
+        description: Only orders made before this ISO-8601 date/datetime
+      - name: customer_id
+        in: query
+        type: int
+        required: false
+        description: Only orders made by this customer
+      - name: item
+        in: query
+        type: string
+        required: false
+        description: Only orders whose item starts with this prefix
+      - name: source
+        in: query
+        type: string
+        required: false
+        description: Set to raw to skip the daily rollups and aggregate the orders table
+      - name: bucket
+        in: query
+        type: string
+        required: false
+        description: day (default), week or month
+    responses:
+      200:
+        description: Aggregates per period, oldest first
+      400:
+        description: Invalid filter or bucket
+    """
+    bucket = request.args.get("bucket", "day")
+    if bucket not in analytics.BUCKETS:
+        return jsonify({"error": "bucket must be one of day, week or month!"}), 400
+    data = analytics.timeseries(bucket, request.args)
+    return conditional_response(jsonify(data))
+
+
+def _grouped_stats(group):
+    limit = get_limit()
+    data = analytics.grouped(group, request.args, limit)
+    return conditional_response(jsonify(data))
+
+
+@bp.route("/api/v1/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """Get the hit and miss counters of the cache in front of single lookups
+    Specifications
+    ---
+    responses:
+      200:
+        description: Cache backend in use with its hit and miss counters for this worker
+    """
+    return jsonify(cache.stats()), 200
+
+
+@bp.route("/api/v1/db/pool", methods=["GET"])
+def get_pool_stats():
+    """Get the state and checkout metrics of the database connection pool
+    Specifications
+    ---
+    responses:
+      200:
+        description: Pool class, connections in use and checkout wait times for this worker, with the replica's under replica when one is configured
+    """
+    data = pool_stats(db.engine)
+    if replica_router.engine is not None:
+        data["replica"] = pool_stats(replica_router.engine)
+        data["replica"]["available"] = replica_router.available()
+    return jsonify(data), 200
 
 
 # Error Endpoints
 @bp.errorhandler(404)
 def not_found(error):
     return make_response(jsonify({"error": "Not Found"}), 404)
+
+
+@bp.errorhandler(InvalidFilter)
+@bp.errorhandler(InvalidPageArgs)
+@bp.errorhandler(InvalidFields)
+@bp.errorhandler(InvalidInclude)
+def invalid_query_args(error):
+    return jsonify({"error": str(error)}), 400
+
+
+@bp.errorhandler(services.ServiceError)
+def service_error(error):
+    return jsonify(error.to_dict()), error.status_code
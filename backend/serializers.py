@@ -0,0 +1,138 @@
+"""Serialization of customers and orders for the API
+
+Listings query the columns below instead of whole ORM objects, which skips
+the identity map and attribute instrumentation, and every endpoint builds
+its dicts with the functions of this module. Amounts are left as Decimal
+and timestamps as datetime: the orjson provider registered on the app
+writes datetimes in ISO-8601 and amounts as numbers, or as strings when
+API_DECIMAL_AS_STRING is set so that no precision is lost.
+
+A `fields=` query parameter narrows both the columns selected and the keys
+written, see `get_fields`, and `include=` embeds related rows, see
+`get_include`.
+"""
+import json
+from decimal import Decimal
+
+import orjson
+from flask.json.provider import JSONProvider
+
+from backend.models import Customer, Order
+
+CUSTOMER_COLUMNS = (Customer.id, Customer.name, Customer.email, Customer.contact)
+ORDER_COLUMNS = (Order.id, Order.customer_id, Order.item, Order.amount, Order.time)
+
+
+class InvalidFields(Exception):
+    """Raised when the `fields` query parameter names an unknown field"""
+
+
+def get_fields(args, columns):
+    """Names of the fields asked for with `fields=`, all of `columns` if absent
+
+    Fields are written in the order they are asked for.
+    """
+    names = [column.key for column in columns]
+    value = args.get("fields")
+    if value is None:
+        return names
+    fields = list(dict.fromkeys(f.strip() for f in value.split(",") if f.strip()))
+    if not fields:
+        raise InvalidFields("fields cannot be empty!")
+    unknown = [field for field in fields if field not in names]
+    if unknown:
+        raise InvalidFields(
+            f"Unknown fields {', '.join(unknown)}! Pick from {', '.join(names)}"
+        )
+    return fields
+
+
+class InvalidInclude(Exception):
+    """Raised when the `include` query parameter names an unknown relation"""
+
+
+def get_include(args, allowed):
+    """Names of the relations asked for with `include=`, out of `allowed`"""
+    include = [name for name in args.get("include", "").split(",") if name]
+    for name in include:
+        if name not in allowed:
+            raise InvalidInclude(f"Cannot include {name}!")
+    return include
+
+
+def select_columns(columns, fields, required=()):
+    """The columns of `fields`, plus the `required` ones the query relies on"""
+    wanted = set(fields).union(column.key for column in required)
+    return tuple(column for column in columns if column.key in wanted)
+
+
+def project(row, fields):
+    """Serialize only `fields` of a row, or of a dict already serialized"""
+    if isinstance(row, dict):
+        return {field: row[field] for field in fields}
+    return {field: getattr(row, field) for field in fields}
+
+
+def customer_to_dict(customer):
+    """Serialize a Customer, or a row of CUSTOMER_COLUMNS"""
+    return {
+        "id": customer.id,
+        "name": customer.name,
+        "email": customer.email,
+        "contact": customer.contact,
+    }
+
+
+def order_to_dict(order):
+    """Serialize an Order, or a row of ORDER_COLUMNS"""
+    return {
+        "id": order.id,
+        "customer_id": order.customer_id,
+        "item": order.item,
+        "amount": order.amount,
+        "time": order.time,
+    }
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider encoding with orjson
+
+    orjson writes datetimes, dates and UUIDs itself, in ISO-8601; Decimals
+    and objects with an ``__html__`` method go through `default`. Calls
+    passing options orjson does not have, such as the tagged session
+    serializer's, fall back to the stdlib json module.
+    """
+
+    option = orjson.OPT_NON_STR_KEYS
+
+    def default(self, o):
+        if isinstance(o, Decimal):
+            if self._app.config["API_DECIMAL_AS_STRING"]:
+                return str(o)
+            return float(o)
+        if hasattr(o, "__html__"):
+            return str(o.__html__())
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+    def _dumps(self, obj):
+        return orjson.dumps(obj, default=self.default, option=self.option)
+
+    def dumps(self, obj, **kwargs):
+        # orjson takes no options such as separators, which the session
+        # serializer passes, so calls with options go to the stdlib
+        if kwargs:
+            kwargs.setdefault("default", self.default)
+            return json.dumps(obj, **kwargs)
+        return self._dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        # nor an object_hook, which untags the session values
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            self._dumps(obj) + b"\n", mimetype="application/json"
+        )
@@ -0,0 +1,353 @@
+"""Business logic shared by the HTML views and the API endpoints
+
+The views and the API both call these functions in-process, instead of the
+views sending HTTP requests back to the API.
+"""
+
+import math
+from contextlib import contextmanager
+from decimal import ROUND_HALF_UP, Decimal
+
+from flask import current_app
+from psycopg2.errors import UniqueViolation
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+
+from backend import db, cache, rollups
+from backend.models import Customer, Order
+
+
+class ServiceError(Exception):
+    """A request the service layer refuses, turned into a JSON error"""
+
+    status_code = 400
+
+    def __init__(self, message, status_code=None, errors=None):
+        super().__init__(message)
+        self.message = message
+        if status_code is not None:
+            self.status_code = status_code
+        self.errors = errors
+
+    def to_dict(self):
+        if self.errors is not None:
+            return {"errors": self.errors}
+        return {"error": self.message}
+
+
+class NotFoundError(ServiceError):
+    status_code = 404
+
+    def to_dict(self):
+        return {"message": self.message}
+
+
+CUSTOMER_FIELDS = [("name", 255), ("email", 100), ("contact", 12)]
+# the unique index making a customer's email its natural key
+CUSTOMER_EMAIL_INDEX = "ix_customers_email"
+# the largest amount a Numeric(10, 2) column holds
+MAX_AMOUNT = Decimal("99999999.99")
+
+
+def validate_customer(data):
+    """Return the reason `data` is not a valid customer, or None"""
+    if not isinstance(data, dict):
+        return "Expected a JSON object!"
+    for field, _ in CUSTOMER_FIELDS:
+        if field not in data:
+            return f"Missing {field} field in the data provided!"
+    for field, max_length in CUSTOMER_FIELDS:
+        value = data[field]
+        if not isinstance(value, str) or not 0 < len(value) <= max_length:
+            return f"{field} must be a string of 1 to {max_length} characters!"
+    return None
+
+
+def validate_order(data):
+    """Return the reason `data` is not a valid order, or None"""
+    if not isinstance(data, dict):
+        return "Expected a JSON object!"
+    for field in ["customer_id", "item", "amount"]:
+        if field not in data:
+            return f"Missing {field} field in the data provided!"
+    if not isinstance(data["customer_id"], int) or isinstance(
+        data["customer_id"], bool
+    ):
+        return "customer_id must be an integer!"
+    if not isinstance(data["item"], str) or not 0 < len(data["item"]) <= 255:
+        return "item must be a string of 1 to 255 characters!"
+    amount = data["amount"]
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        return "amount must be a number!"
+    if isinstance(amount, float) and not math.isfinite(amount):
+        return "amount must be a number!"
+    # Postgres rounds half away from zero to 2 places before the range check
+    rounded = Decimal(str(amount)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    if not 0 <= amount or rounded > MAX_AMOUNT:
+        return "amount must be between 0 and 99999999.99!"
+    return None
+
+
+def commit():
+    """Commit the session, or only flush it inside `deferred_commit`"""
+    if db.session.info.get("defer_commit"):
+        db.session.flush()
+        # reloaded as a commit would, so callers see the values the database
+        # stored, e.g. amounts rounded to the column's scale
+        db.session.expire_all()
+    else:
+        db.session.commit()
+
+
+@contextmanager
+def deferred_commit():
+    """Leave the commit of what the services write to the caller
+
+    The caller can then write rows of its own in the same transaction, as
+    the idempotency keys do with the response of the request.
+    """
+    db.session.info["defer_commit"] = True
+    try:
+        yield
+    finally:
+        db.session.info.pop("defer_commit", None)
+
+
+def _require_fields(data, fields, message=None):
+    if not data:
+        raise ServiceError("No data provided!")
+    for field in fields:
+        if field not in data:
+            raise ServiceError(
+                message or f"Missing {field} field in the data provided!"
+            )
+
+
+def _validate_customer(data):
+    _require_fields(data, ["name", "email", "contact"])
+    error = validate_customer(data)
+    if error:
+        raise ServiceError(error)
+
+
+def _commit_customer():
+    try:
+        commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if (
+            isinstance(e.orig, UniqueViolation)
+            and e.orig.diag.constraint_name == CUSTOMER_EMAIL_INDEX
+        ):
+            raise ServiceError("A customer with that email already exists!", 409)
+        raise
+
+
+# Customers
+def get_or_create_customer_id(name, email, contact):
+    """Return the id of the customer with `email`, creating it on first sight
+
+    Safe when the same user logs in twice at once: the INSERT waits for and
+    then skips a row another transaction is adding for the email, which the
+    SELECT then finds.
+    """
+    stmt = (
+        pg_insert(Customer)
+        .values(name=name, email=email, contact=contact)
+        .on_conflict_do_nothing(index_elements=[Customer.email])
+        .returning(Customer.id)
+    )
+    customer_id = db.session.scalar(stmt)
+    if customer_id is None:
+        customer_id = db.session.scalar(
+            db.select(Customer.id).where(Customer.email == email)
+        )
+    commit()
+    return customer_id
+
+
+def create_customer(data):
+    _validate_customer(data)
+    customer = Customer(name=data["name"], email=data["email"], contact=data["contact"])
+    db.session.add(customer)
+    _commit_customer()
+    cache.delete(f"customer:{customer.id}")
+    return customer
+
+
+def update_customer(customer_id, data):
+    _validate_customer(data)
+    customer = Customer.query.get(customer_id)
+    if not customer:
+        raise NotFoundError("Customer not found")
+    customer.name = data["name"]
+    customer.email = data["email"]
+    customer.contact = data["contact"]
+    _commit_customer()
+    cache.delete(f"customer:{customer_id}")
+    return customer
+
+
+def delete_customer(customer_id):
+    customer = Customer.query.get(customer_id)
+    if not customer:
+        raise NotFoundError("Customer not found")
+    db.session.delete(customer)
+    commit()
+    cache.delete(f"customer:{customer_id}")
+
+
+def upsert_customers_bulk(rows, errors=None):
+    """Create or update `rows`, matched on email, returning (created, updated)
+
+    `errors` holds problems already found while parsing the body, e.g.
+    unparsable NDJSON lines which show up as None in `rows`. Nothing is
+    written unless every row is valid.
+    """
+    errors = list(errors or [])
+    _check_batch_size(rows, "customers")
+
+    # ON CONFLICT cannot touch the same row twice in one statement, so the
+    # last record sent for an email wins
+    by_email = {}
+    for index, row in enumerate(rows):
+        if row is None:
+            continue
+        error = validate_customer(row)
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            by_email[row["email"]] = {
+                "name": row["name"],
+                "email": row["email"],
+                "contact": row["contact"],
+            }
+    if errors:
+        raise ServiceError("Invalid customers", errors=_sorted(errors))
+
+    values = list(by_email.values())
+    created = updated = 0
+    updated_ids = []
+    chunk_size = current_app.config["BULK_STATEMENT_SIZE"]
+    for start in range(0, len(values), chunk_size):
+        stmt = pg_insert(Customer).values(values[start : start + chunk_size])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Customer.email],
+            set_={"name": stmt.excluded.name, "contact": stmt.excluded.contact},
+        )
+        # xmax is only 0 for rows that were freshly inserted
+        stmt = stmt.returning(Customer.id, db.literal_column("xmax = 0"))
+        for id, inserted in db.session.execute(stmt):
+            if inserted:
+                created += 1
+            else:
+                updated += 1
+                updated_ids.append(id)
+    commit()
+    cache.delete(*[f"customer:{id}" for id in updated_ids])
+    return created, updated
+
+
+# Orders
+def create_order(data):
+    # this message is part of the API, clients match on it
+    _require_fields(
+        data,
+        ["customer_id", "item", "amount"],
+        "Missing name field in the data provided!",
+    )
+    order = Order(
+        customer_id=data["customer_id"], item=data["item"], amount=data["amount"]
+    )
+    db.session.add(order)
+    commit()
+    cache.delete(f"order:{order.id}")
+    return order
+
+
+def update_order(order_id, data):
+    _require_fields(data, ["customer_id", "item", "amount"])
+    order = Order.query.get(order_id)
+    if not order:
+        raise NotFoundError("Order not found")
+    order.customer_id = data["customer_id"]
+    order.item = data["item"]
+    order.amount = data["amount"]
+    commit()
+    cache.delete(f"order:{order_id}")
+    return order
+
+
+def delete_order(order_id):
+    order = Order.query.get(order_id)
+    if not order:
+        raise NotFoundError("Order not found")
+    db.session.delete(order)
+    commit()
+    cache.delete(f"order:{order_id}")
+
+
+def create_orders_bulk(rows, errors=None):
+    """Insert every order of `rows` at once and return their ids in order
+
+    Rows are all validated, and their customers checked with a single query,
+    before one multi-row INSERT ... RETURNING is sent. Nothing is written
+    unless every row is valid.
+    """
+    errors = list(errors or [])
+    _check_batch_size(rows, "orders")
+
+    valid = []
+    for index, row in enumerate(rows):
+        if row is None:
+            continue
+        error = validate_order(row)
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            valid.append((index, row))
+
+    customer_ids = {row["customer_id"] for _, row in valid}
+    existing = set(
+        db.session.scalars(db.select(Customer.id).where(Customer.id.in_(customer_ids)))
+    )
+    for index, row in valid:
+        if row["customer_id"] not in existing:
+            errors.append({"index": index, "error": "Customer not found"})
+    if errors:
+        raise ServiceError("Invalid orders", errors=_sorted(errors))
+
+    values = [
+        {
+            "customer_id": row["customer_id"],
+            "item": row["item"],
+            "amount": row["amount"],
+        }
+        for _, row in valid
+    ]
+    stmt = db.insert(Order).returning(
+        Order.id, Order.time, sort_by_parameter_order=True
+    )
+    inserted = db.session.execute(stmt, values).all()
+    # Core inserts bypass the ORM events maintaining the rollups
+    rollups.add_orders(
+        db.session.connection(),
+        [
+            (row.time, value["customer_id"], value["item"], value["amount"])
+            for row, value in zip(inserted, values)
+        ],
+    )
+    commit()
+    return [row.id for row in inserted]
+
+
+def _check_batch_size(rows, name):
+    if not rows:
+        raise ServiceError("No data provided!")
+    max_batch_size = current_app.config["BULK_MAX_BATCH_SIZE"]
+    if len(rows) > max_batch_size:
+        raise ServiceError(f"At most {max_batch_size} {name} can be sent at once!", 413)
+
+
+def _sorted(errors):
+    return sorted(errors, key=lambda e: e["index"])
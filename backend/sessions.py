@@ -0,0 +1,200 @@
+"""Server-side sessions, kept in the user_sessions table
+
+With SESSION_TYPE=database (the default) the session cookie only carries a
+signed random id, and the session data lives in the database. Pages load it
+with a primary key lookup and only write it back when it changed, or when
+less than half of its lifetime is left. Sessions expire after
+PERMANENT_SESSION_LIFETIME, and `flask sessions purge` deletes the expired
+ones.
+
+The API, the docs and the metrics never use the session, so requests to
+them get Flask's null session and never touch the table, even though
+browsers send them the cookie as well. SESSION_TYPE=cookie keeps Flask's
+signed cookie sessions.
+"""
+import secrets
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, Signer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from backend import db
+from backend.models import UserSession
+
+sessions_cli = AppGroup("sessions", help="Manage the server-side sessions.")
+
+
+class ServerSideSession(SecureCookieSession):
+    """Session data, tracked for changes, and the id it is stored under"""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.old_sid = None
+
+    def regenerate(self):
+        """Store the session under a new id, as at login against fixation"""
+        if self.sid is not None:
+            self.old_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class DatabaseSessionInterface(SessionInterface):
+    """Session interface reading and writing sessions of the user_sessions table"""
+
+    serializer = TaggedJSONSerializer()
+    salt = "server-side-session"
+    # requests that never use the session, spared its lookup
+    exempt_prefixes = (
+        "/api/",
+        "/apidocs/",
+        "/apispec_",
+        "/flasgger_static/",
+        "/static/",
+        "/metrics",
+    )
+
+    def get_signer(self, app):
+        if not app.secret_key:
+            return None
+        return Signer(app.secret_key, salt=self.salt)
+
+    def get_sid(self, app, request):
+        value = request.cookies.get(self.get_cookie_name(app))
+        if not value:
+            return None
+        try:
+            return self.get_signer(app).unsign(value).decode()
+        except BadSignature:
+            return None
+
+    def open_session(self, app, request):
+        if self.get_signer(app) is None:
+            return None
+        if request.path.startswith(self.exempt_prefixes):
+            return self.make_null_session(app)
+        sid = self.get_sid(app, request)
+        if sid is None:
+            return ServerSideSession()
+        # on the primary: a write to the session must be read back at once
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                db.select(UserSession.data, UserSession.expires_at).where(
+                    UserSession.id == sid,
+                    UserSession.expires_at > datetime.utcnow(),
+                )
+            ).first()
+        if row is None:
+            return ServerSideSession()
+        return ServerSideSession(
+            self.serializer.loads(row.data), sid=sid, expires_at=row.expires_at
+        )
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session:
+            stale = [sid for sid in (session.sid, session.old_sid) if sid]
+            if stale:
+                with db.engine.begin() as connection:
+                    connection.execute(
+                        db.delete(UserSession).where(UserSession.id.in_(stale))
+                    )
+            if session.modified:
+                response.delete_cookie(
+                    name,
+                    domain=domain,
+                    path=path,
+                    secure=secure,
+                    samesite=samesite,
+                    httponly=httponly,
+                )
+            return
+
+        now = datetime.utcnow()
+        lifetime = app.permanent_session_lifetime
+        expiring = (
+            session.expires_at is not None and session.expires_at - now < lifetime / 2
+        )
+        new = session.sid is None
+        if not (new or session.modified or expiring):
+            return
+        if new:
+            session.sid = secrets.token_urlsafe(32)
+        values = {
+            "id": session.sid,
+            "data": self.serializer.dumps(dict(session)),
+            "expires_at": now + lifetime,
+        }
+        stmt = pg_insert(UserSession).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserSession.id],
+            set_={"data": stmt.excluded.data, "expires_at": stmt.excluded.expires_at},
+        )
+        with db.engine.begin() as connection:
+            if session.old_sid:
+                connection.execute(
+                    db.delete(UserSession).where(UserSession.id == session.old_sid)
+                )
+            connection.execute(stmt)
+
+        if new or session.permanent:
+            response.set_cookie(
+                name,
+                self.get_signer(app).sign(session.sid).decode(),
+                expires=self.get_expiration_time(app, session),
+                httponly=httponly,
+                domain=domain,
+                path=path,
+                secure=secure,
+                samesite=samesite,
+            )
+
+
+def configure_sessions(app):
+    """Install the session interface picked with SESSION_TYPE"""
+    session_type = app.config["SESSION_TYPE"]
+    if session_type == "database":
+        app.session_interface = DatabaseSessionInterface()
+    elif session_type != "cookie":
+        raise ValueError(f"Unknown SESSION_TYPE {session_type!r}")
+
+
+def purge(batch_size=1000):
+    """Delete the expired sessions in batches, returning how many were deleted"""
+    deleted = 0
+    while True:
+        expired = (
+            db.select(UserSession.id)
+            .where(UserSession.expires_at <= datetime.utcnow())
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        result = db.session.execute(
+            db.delete(UserSession).where(UserSession.id.in_(expired))
+        )
+        db.session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+@sessions_cli.command("purge")
+@click.option("--batch-size", default=1000, help="Sessions deleted per transaction.")
+def purge_command(batch_size):
+    """Delete the expired sessions."""
+    click.echo(f"Deleted {purge(batch_size)} expired sessions")
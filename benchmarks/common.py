@@ -0,0 +1,129 @@
+"""Helpers shared by the benchmarks: the app, test data and results files
+
+Every benchmark can write its numbers with `--output results.json`;
+`benchmarks/compare.py` then shows how two such files differ.
+"""
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import create_app, db, rollups  # noqa: E402
+from backend.models import Customer, Order  # noqa: E402
+from config import Config  # noqa: E402
+
+ITEMS = ["Laptop", "Phone", "Tablet", "Monitor", "Keyboard", "Mouse", "Headset"]
+# rows per INSERT while seeding
+CHUNK_SIZE = 10000
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get("BENCHMARK_DATABASE_URL")
+    NOTIFICATIONS_WORKER = False
+    SMS_BACKEND = "fake"
+    # keep the cache and the logs out of the numbers
+    CACHE_TYPE = "null"
+    DB_SLOW_QUERY_MS = 0
+
+
+def create_benchmark_app(parser):
+    """The app on BENCHMARK_DATABASE_URL, with its tables created"""
+    if not BenchmarkConfig.SQLALCHEMY_DATABASE_URI:
+        parser.error("BENCHMARK_DATABASE_URL is not set")
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed(customers, orders, seed=0):
+    """Top the database up to `customers` customers and `orders` orders
+
+    Orders are spread at random over the customers and over the last year.
+    The rows are inserted with Core statements, so the rollups are rebuilt
+    at the end.
+    """
+    rng = random.Random(seed)
+    existing = db.session.scalar(db.select(db.func.count(Customer.id)))
+    for start in range(existing, customers, CHUNK_SIZE):
+        db.session.execute(
+            db.insert(Customer),
+            [
+                {
+                    "name": f"Customer {i}",
+                    "email": f"customer{i}@example.com",
+                    "contact": f"2547{i:08d}",
+                }
+                for i in range(start, min(start + CHUNK_SIZE, customers))
+            ],
+        )
+    customer_ids = db.session.scalars(db.select(Customer.id)).all()
+
+    existing = db.session.scalar(db.select(db.func.count(Order.id)))
+    now = datetime.utcnow()
+    for start in range(existing, orders, CHUNK_SIZE):
+        db.session.execute(
+            db.insert(Order),
+            [
+                {
+                    "customer_id": rng.choice(customer_ids),
+                    "item": rng.choice(ITEMS),
+                    "amount": round(rng.uniform(1, 5000), 2),
+                    "time": now - timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+                }
+                for _ in range(start, min(start + CHUNK_SIZE, orders))
+            ],
+        )
+    db.session.commit()
+    rollups.backfill()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def latency_summary(latencies, duration=None):
+    """p50/p95/p99 in milliseconds, and the throughput over `duration`"""
+    duration = duration if duration is not None else sum(latencies)
+    return {
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, benchmark, parameters, results):
+    """Save `results`, a dict of named measurements, with what produced them"""
+    data = {
+        "benchmark": benchmark,
+        "date": datetime.utcnow().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "parameters": parameters,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    print(f"Wrote the results to {path}")
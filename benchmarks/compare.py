@@ -0,0 +1,43 @@
+"""Compare two results files written by the benchmarks' --output
+
+    python benchmarks/compare.py before.json after.json
+
+Prints every measurement found in both files with its relative change.
+"""
+import argparse
+import json
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before["benchmark"] != after["benchmark"]:
+        parser.error(
+            f"Cannot compare {before['benchmark']} with {after['benchmark']} results"
+        )
+
+    print(
+        f"{before['commit']} ({before['date']}) -> {after['commit']} ({after['date']})"
+    )
+    for name, old in before["results"].items():
+        new = after["results"].get(name)
+        if new is None:
+            continue
+        print(name)
+        for metric, old_value in old.items():
+            new_value = new.get(metric)
+            if not isinstance(old_value, (int, float)) or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value * 100 if old_value else 0
+            print(f"{metric:>24}: {old_value:12.3f} {new_value:12.3f} {change:+8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""CPU cost and size savings of every compression algorithm and level
+
+    BENCHMARK_DATABASE_URL=postgresql+psycopg2://... python benchmarks/compression.py
+
+Takes real response bodies from the app (a page of --limit orders, the same
+as NDJSON, and customers with their orders embedded), compresses each with
+the algorithms of `backend.compression` at a few levels, and reports the
+compressed size and the time spent per body. The levels picked by
+COMPRESS_*_LEVEL should sit where the time still stays small next to the
+transfer time they save.
+"""
+import argparse
+import time
+
+# common puts the repository on sys.path
+from common import create_benchmark_app, seed, write_results
+from backend.compression import CODECS
+
+LEVELS = {"gzip": [1, 6, 9], "br": [1, 4, 6, 9], "zstd": [1, 3, 9, 15]}
+
+
+def get_bodies(app, limit):
+    client = app.test_client()
+    bodies = {}
+    for name, url in [
+        ("orders", f"/api/v1/orders?limit={limit}"),
+        ("orders ndjson", "/api/v1/orders?stream=1"),
+        ("customers with orders", f"/api/v1/customers?include=orders&limit={limit}"),
+    ]:
+        response = client.get(url)
+        bodies[name] = response.get_data()
+    return bodies
+
+
+def measure(codec, data, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        compressed = codec.compress(data)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(compressed), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=1000, help="Rows per body.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs, best is kept.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    app = create_benchmark_app(parser)
+    with app.app_context():
+        seed(args.customers, args.orders)
+    bodies = get_bodies(app, args.limit)
+
+    results = {}
+    for body, data in bodies.items():
+        print(f"{body}: {len(data):,} bytes")
+        for name, levels in LEVELS.items():
+            for level in levels:
+                try:
+                    codec = CODECS[name](level)
+                except ImportError:
+                    print(f"{name:>8}: not installed")
+                    break
+                size, elapsed = measure(codec, data, args.repeat)
+                results[f"{body} {name} {level}"] = {
+                    "bytes": size,
+                    "ratio": round(len(data) / size, 2),
+                    "ms": round(elapsed * 1000, 3),
+                    "mb_per_second": round(len(data) / elapsed / 1e6, 1),
+                }
+                print(
+                    f"{name:>8} {level:2d}: {size:10,} bytes {len(data) / size:6.1f}x"
+                    f" {elapsed * 1000:8.2f} ms {len(data) / elapsed / 1e6:8.1f} MB/s"
+                )
+
+    if args.output:
+        write_results(args.output, "compression", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Throughput and latency of a server under a fixed number of concurrent clients
+
+Start the deployment to measure with the same number of workers, e.g.
+
+    gunicorn -w 1 -b :8000 main:app
+    gunicorn -w 1 -b :8001 -k uvicorn.workers.UvicornWorker asgi:app
+
+and run the same load against both:
+
+    python benchmarks/concurrency.py http://localhost:8000/api/v1/orders?limit=100
+    python benchmarks/concurrency.py http://localhost:8001/api/v1/orders?limit=100
+
+A sync worker answers one request at a time, so its latency grows with the
+number of clients, while an async worker keeps serving requests while others
+wait on the database.
+
+With --serve the server is started here, with gunicorn.conf.py, on
+BENCHMARK_DATABASE_URL when it is set, and stopped at the end; URLs are then
+paths on it:
+
+    python benchmarks/concurrency.py --serve main:app --workers 4 \
+        /api/v1/orders /api/v1/customers --output load.json
+
+Clients go through the URLs in turn, and each URL gets its own numbers.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from itertools import cycle
+
+import httpx
+
+from common import ROOT, latency_summary, write_results
+
+
+async def client(http, urls, deadline, latencies, errors):
+    for url in cycle(urls):
+        if time.perf_counter() >= deadline:
+            return
+        started = time.perf_counter()
+        try:
+            response = await http.get(url)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            errors.append(url)
+            continue
+        latencies[url].append(time.perf_counter() - started)
+
+
+async def run(base_url, urls, concurrency, duration):
+    latencies, errors = defaultdict(list), []
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *[
+                # clients start at different URLs
+                client(http, urls[i:] + urls[:i], deadline, latencies, errors)
+                for i in range(concurrency)
+            ]
+        )
+    return latencies, errors
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app, workers, worker_class):
+    """Start gunicorn on a free port and wait until it answers"""
+    port = free_port()
+    env = dict(os.environ, GUNICORN_ACCESS_LOG=os.devnull, NOTIFICATIONS_WORKER="0")
+    if os.environ.get("BENCHMARK_DATABASE_URL"):
+        env["DEVELOPMENT_DATABASE_URL"] = os.environ["BENCHMARK_DATABASE_URL"]
+        env.pop("CONFIG_MODE", None)
+    # fmt: off
+    command = [
+        sys.executable, "-m", "gunicorn", app,
+        "-c", "gunicorn.conf.py",
+        "-b", f"127.0.0.1:{port}",
+        "-w", str(workers),
+        "-k", worker_class,
+    ]
+    # fmt: on
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {server.returncode}")
+        try:
+            httpx.get(base_url + "/metrics", timeout=1)
+            return server, base_url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start in 30s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="Seconds.")
+    parser.add_argument("--serve", metavar="APP", help="Start gunicorn with APP.")
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("-k", "--worker-class", default="gthread")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    server, base_url = None, ""
+    if args.serve:
+        server, base_url = start_server(args.serve, args.workers, args.worker_class)
+    try:
+        latencies, errors = asyncio.run(
+            run(base_url, args.urls, args.concurrency, args.duration)
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results = {}
+    for url in args.urls:
+        if latencies[url]:
+            results[url] = latency_summary(latencies[url], args.duration)
+            results[url]["errors"] = errors.count(url)
+    if not results:
+        print(f"no successful requests, {len(errors)} errors")
+        return
+    if len(args.urls) > 1:
+        every = [latency for url in args.urls for latency in latencies[url]]
+        results["all"] = latency_summary(every, args.duration)
+        results["all"]["errors"] = len(errors)
+    for url, summary in results.items():
+        print(url)
+        print(f"{summary['requests_per_second']:10.1f} requests/s")
+        for name in ["p50", "p95", "p99"]:
+            print(f"{summary[name + '_ms']:10.1f} ms {name}")
+        print(f"{summary['errors']:10d} errors")
+
+    if args.output:
+        write_results(args.output, "concurrency", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Latency of every API endpoint, through the Flask test client
+
+    BENCHMARK_DATABASE_URL=postgresql+psycopg2://... python benchmarks/endpoints.py \
+        --customers 1000 --orders 100000 --output endpoints.json
+
+Seeds the database up to the given counts (see seed.py), then calls each
+endpoint --requests times in this process, without a server or network in
+between, which isolates the cost of the app and its queries. The writes
+create their own customers and orders, update them and delete them again,
+leaving the data as it was. --only runs the benchmarks whose name contains
+one of the given words.
+"""
+import argparse
+import random
+import time
+
+from common import (
+    Customer,
+    Order,
+    create_benchmark_app,
+    db,
+    latency_summary,
+    seed,
+    write_results,
+)
+
+WARMUP = 10
+
+
+class Case(object):
+    """One endpoint to time: its method, a URL and a body for each call"""
+
+    def __init__(self, name, method, url, body=None, status=200):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.body = body
+        self.status = status
+
+    def run(self, client, i):
+        body = self.body(i) if self.body else None
+        response = client.open(self.url(i), method=self.method, json=body)
+        if response.status_code != self.status:
+            raise RuntimeError(
+                f"{self.name}: {self.method} {self.url(i)} answered"
+                f" {response.status_code} {response.get_data(as_text=True)[:200]}"
+            )
+        return response
+
+
+def make_cases(customer_ids, order_ids, rng):
+    created_customers, created_orders = [], []
+
+    def customer(i):
+        return {
+            "name": f"Bench {i}",
+            "email": f"bench-{i}-{rng.random()}@example.com",
+            "contact": "254700000000",
+        }
+
+    def order(i):
+        return {
+            "customer_id": rng.choice(customer_ids),
+            "item": "Benchmark",
+            "amount": round(rng.uniform(1, 5000), 2),
+        }
+
+    class CreateCase(Case):
+        def __init__(self, name, url, body, created):
+            super().__init__(name, "POST", url, body, 201)
+            self.created = created
+
+        def run(self, client, i):
+            response = super().run(client, i)
+            self.created.append(response.json["id"])
+            return response
+
+    def any_customer(_):
+        return rng.choice(customer_ids)
+
+    def any_order(_):
+        return rng.choice(order_ids)
+
+    return [
+        Case("list customers", "GET", lambda i: "/api/v1/customers"),
+        Case(
+            "list customers with orders",
+            "GET",
+            lambda i: "/api/v1/customers?include=orders",
+        ),
+        Case("get customer", "GET", lambda i: f"/api/v1/customers/{any_customer(i)}"),
+        Case(
+            "list customer orders",
+            "GET",
+            lambda i: f"/api/v1/customers/{any_customer(i)}/orders",
+        ),
+        Case("list orders", "GET", lambda i: "/api/v1/orders"),
+        Case(
+            "list orders filtered",
+            "GET",
+            lambda i: "/api/v1/orders?item=Phone&min_amount=1000",
+        ),
+        Case("get order", "GET", lambda i: f"/api/v1/orders/{any_order(i)}"),
+        Case("stats summary", "GET", lambda i: "/api/v1/stats/summary"),
+        CreateCase(
+            "create customer",
+            lambda i: "/api/v1/customers",
+            customer,
+            created_customers,
+        ),
+        Case(
+            "update customer",
+            "PUT",
+            lambda i: f"/api/v1/customers/{created_customers[i]}",
+            customer,
+            201,
+        ),
+        CreateCase("create order", lambda i: "/api/v1/orders", order, created_orders),
+        Case(
+            "update order",
+            "PUT",
+            lambda i: f"/api/v1/orders/{created_orders[i]}",
+            order,
+            201,
+        ),
+        Case(
+            "delete order",
+            "DELETE",
+            lambda i: f"/api/v1/orders/{created_orders[i]}",
+        ),
+        Case(
+            "delete customer",
+            "DELETE",
+            lambda i: f"/api/v1/customers/{created_customers[i]}",
+            status=201,
+        ),
+    ]
+
+
+def measure(case, client, requests):
+    """Time `requests` calls of `case`, after a few untimed ones"""
+    for i in range(WARMUP):
+        case.run(client, i)
+    latencies = []
+    for i in range(WARMUP, WARMUP + requests):
+        started = time.perf_counter()
+        case.run(client, i)
+        latencies.append(time.perf_counter() - started)
+    return latency_summary(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("--only", nargs="*", help="Benchmarks to run, by name.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    app = create_benchmark_app(parser)
+    with app.app_context():
+        seed(args.customers, args.orders)
+        customer_ids = db.session.scalars(db.select(Customer.id)).all()
+        order_ids = db.session.scalars(db.select(Order.id)).all()
+        db.session.remove()
+
+    rng = random.Random(0)
+    client = app.test_client()
+    results = {}
+    for case in make_cases(customer_ids, order_ids, rng):
+        if args.only and not any(word in case.name for word in args.only):
+            continue
+        results[case.name] = summary = measure(case, client, args.requests)
+        print(
+            f"{case.name:>28}: {summary['p50_ms']:8.2f} ms p50"
+            f" {summary['p95_ms']:8.2f} ms p95 {summary['p99_ms']:8.2f} ms p99"
+            f" {summary['requests_per_second']:9.1f} requests/s"
+        )
+
+    if args.output:
+        write_results(args.output, "endpoints", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
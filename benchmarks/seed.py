@@ -0,0 +1,34 @@
+"""Fill a scratch database with customers and orders for the benchmarks
+
+    BENCHMARK_DATABASE_URL=postgresql+psycopg2://... python benchmarks/seed.py \
+        --customers 1000 --orders 100000
+
+Tables are created if missing and topped up to the given counts, so running
+it again is cheap. --reset drops every table first.
+"""
+import argparse
+import time
+
+from common import create_benchmark_app, db, seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--reset", action="store_true", help="Drop the tables first.")
+    args = parser.parse_args()
+
+    app = create_benchmark_app(parser)
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+            db.create_all()
+        started = time.perf_counter()
+        seed(args.customers, args.orders)
+        elapsed = time.perf_counter() - started
+    print(f"Seeded {args.customers} customers, {args.orders} orders in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
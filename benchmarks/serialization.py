@@ -0,0 +1,73 @@
+"""Rows per second of the order listing, before and after the serializers
+
+    BENCHMARK_DATABASE_URL=postgresql+psycopg2://... python benchmarks/serialization.py
+
+Seeds the database with --rows orders if it holds fewer (see seed.py), then
+times the two ways of turning a page of orders into a JSON body: ORM
+objects, hand built dicts and Flask's default provider against column
+tuples, the serializers and the orjson provider. The tables are created
+with `db.create_all()`, so point it at a scratch database.
+"""
+import argparse
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+# common puts the repository on sys.path
+from common import Order, create_benchmark_app, db, seed, write_results
+from backend.serializers import ORDER_COLUMNS, order_to_dict
+
+
+def before(app, limit):
+    orders = Order.query.order_by(Order.id).limit(limit).all()
+    order_list = [
+        {
+            "id": o.id,
+            "customer_id": o.customer_id,
+            "item": o.item,
+            "amount": float(o.amount),
+            "time": o.time,
+        }
+        for o in orders
+    ]
+    return DefaultJSONProvider(app).dumps(order_list)
+
+
+def after(app, limit):
+    query = db.session.query(*ORDER_COLUMNS).order_by(Order.id).limit(limit)
+    return app.json.dumps([order_to_dict(o) for o in query])
+
+
+def measure(func, app, limit, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        func(app, limit)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return limit / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="Orders per page.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs, best is kept.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    app = create_benchmark_app(parser)
+    results = {}
+    with app.app_context():
+        seed(max(1, args.rows // 100), args.rows)
+        for name, func in [("before", before), ("after", after)]:
+            rate = measure(func, app, args.rows, args.repeat)
+            results[name] = {"rows_per_second": round(rate)}
+            print(f"{name:>6}: {rate:12,.0f} rows/s")
+
+    if args.output:
+        write_results(args.output, "serialization", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
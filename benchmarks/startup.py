@@ -0,0 +1,70 @@
+"""Time it takes a fresh process to import the app and run create_app
+
+    BENCHMARK_DATABASE_URL=postgresql+psycopg2://... python benchmarks/startup.py
+
+Every run is a new interpreter, as in a booting worker without
+preload_app, and the median of the runs is reported. Imports done lazily on
+first use (OAuth client, API docs, SMS SDK) are not counted, as workers do
+not pay for them until a request needs them.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from common import ROOT, write_results
+
+SCRIPT = """
+import time
+started = time.perf_counter()
+from backend import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+print(imported - started, created - imported)
+"""
+
+
+def run_once():
+    env = dict(os.environ)
+    if os.environ.get("BENCHMARK_DATABASE_URL"):
+        env["DEVELOPMENT_DATABASE_URL"] = os.environ["BENCHMARK_DATABASE_URL"]
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    imported, created = output.split()
+    return float(imported), float(created)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=10)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    imported = statistics.median(run[0] for run in runs) * 1000
+    created = statistics.median(run[1] for run in runs) * 1000
+    print(f"{imported:8.1f} ms import")
+    print(f"{created:8.1f} ms create_app")
+    print(f"{imported + created:8.1f} ms total")
+
+    if args.output:
+        results = {
+            "startup": {
+                "import_ms": round(imported, 1),
+                "create_app_ms": round(created, 1),
+                "total_ms": round(imported + created, 1),
+            }
+        }
+        write_results(args.output, "startup", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 import os
-from dotenv import load_dotenv
+from datetime import timedelta
 
 basedir = os.path.abspath(os.path.dirname(__file__))
-load_dotenv(os.path.join(basedir, ".env"))
+dotenv_path = os.path.join(basedir, ".env")
+# python-dotenv is slow to import and deployments set the environment instead
+if os.path.exists(dotenv_path):
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path)
 
 
 def get_env_variable(name):
@@ -24,6 +29,17 @@ def get_env_db_url(env_setting):
     return SQLALCHEMY_DATABASE_URI
 
 
+def get_engine_options():
+    """SQLAlchemy engine options, sized per gunicorn worker from the environment"""
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "1") == "1",
+    }
+
+
 # DB URLS for each Environment
 DEV_DB_URL = get_env_db_url("development")
 PROD_DB_URL = get_env_db_url("production")
@@ -35,12 +51,76 @@ class Config(object):
     SQLALCHEMY_DATABASE_URI = DEV_DB_URL
     SECRET_KEY = get_env_variable("SECRET_KEY") or "development-testing"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = get_engine_options()
+    # milliseconds, 0 lets queries run for as long as they take
+    DB_STATEMENT_TIMEOUT = int(os.environ.get("DB_STATEMENT_TIMEOUT", 0))
+    # queue keeps DB_POOL_SIZE connections per worker, null opens one per
+    # request and leaves the pooling to PgBouncer
+    DB_POOL_CLASS = os.environ.get("DB_POOL_CLASS", "queue")
+    # GET requests to the API read from this replica when it is set
+    SQLALCHEMY_REPLICA_URI = (get_env_variable("REPLICA_DATABASE_URL") or "").replace(
+        "postgres://", "postgresql://"
+    )
+    DB_READ_YOUR_WRITES_WINDOW = int(os.environ.get("DB_READ_YOUR_WRITES_WINDOW", 5))
+    DB_REPLICA_RETRY_INTERVAL = int(os.environ.get("DB_REPLICA_RETRY_INTERVAL", 30))
     OAUTH2_CLIENT_ID = get_env_variable("OAUTH2_CLIENT_ID")
     OAUTH2_CLIENT_SECRET = get_env_variable("OAUTH2_CLIENT_SECRET")
     OAUTH2_META_URL = get_env_variable("OAUTH2_META_URL")
+    # spec written by `flask apidocs build`, served instead of parsing docstrings
+    SWAGGER_SPEC_FILE = os.environ.get("SWAGGER_SPEC_FILE")
     AFRICASTALKING_USERNAME = get_env_variable("AFRICASTALKING_USERNAME")
     AFRICASTALKING_API_KEY = get_env_variable("AFRICASTALKING_API_KEY")
     AFRICASTALKING_SENDER_ID = get_env_variable("AFRICASTALKING_SENDER_ID")
+    # pagination of the API listings
+    API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", 100))
+    API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", 1000))
+    # write amounts as JSON strings instead of numbers, keeping every digit
+    API_DECIMAL_AS_STRING = os.environ.get("API_DECIMAL_AS_STRING", "0") == "1"
+    # orders embedded per customer by ?include=orders
+    API_NESTED_PAGE_SIZE = int(os.environ.get("API_NESTED_PAGE_SIZE", 10))
+    # rows fetched per round trip by the streaming export
+    STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 1000))
+    # largest number of rows accepted by the bulk endpoints
+    BULK_MAX_BATCH_SIZE = int(os.environ.get("BULK_MAX_BATCH_SIZE", 5000))
+    # rows per INSERT statement when a bulk request is split up
+    BULK_STATEMENT_SIZE = int(os.environ.get("BULK_STATEMENT_SIZE", 1000))
+    # seconds an Idempotency-Key answers retries with the stored response
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 3600))
+    # sessions kept in the user_sessions table behind a signed id cookie
+    # (database) or kept whole in a signed cookie (cookie)
+    SESSION_TYPE = os.environ.get("SESSION_TYPE", "database")
+    PERMANENT_SESSION_LIFETIME = timedelta(
+        seconds=int(os.environ.get("SESSION_LIFETIME", 7 * 24 * 3600))
+    )
+    # cache in front of the single customer/order lookups: lru, redis or null
+    CACHE_TYPE = os.environ.get("CACHE_TYPE", "lru")
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get("CACHE_DEFAULT_TIMEOUT", 60))
+    CACHE_MAX_SIZE = int(os.environ.get("CACHE_MAX_SIZE", 10000))
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_KEY_PREFIX = os.environ.get("CACHE_KEY_PREFIX", "orders-api:")
+    # SMS notifications: africastalking or fake, picked from DEBUG/TESTING if unset
+    SMS_BACKEND = os.environ.get("SMS_BACKEND")
+    NOTIFICATIONS_WORKER = os.environ.get("NOTIFICATIONS_WORKER", "1") == "1"
+    NOTIFICATIONS_BATCH_SIZE = int(os.environ.get("NOTIFICATIONS_BATCH_SIZE", 100))
+    NOTIFICATIONS_MAX_ATTEMPTS = int(os.environ.get("NOTIFICATIONS_MAX_ATTEMPTS", 5))
+    NOTIFICATIONS_RETRY_BACKOFF = int(os.environ.get("NOTIFICATIONS_RETRY_BACKOFF", 30))
+    NOTIFICATIONS_POLL_INTERVAL = int(os.environ.get("NOTIFICATIONS_POLL_INTERVAL", 5))
+    # per endpoint latency and SQL metrics at /metrics, and Server-Timing headers
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+    SERVER_TIMING = os.environ.get("SERVER_TIMING", "1") == "1"
+    # log SQL statements slower than this many milliseconds, 0 to turn off
+    DB_SLOW_QUERY_MS = int(os.environ.get("DB_SLOW_QUERY_MS", 500))
+    # compression of responses larger than COMPRESS_MIN_SIZE bytes, with the
+    # first of COMPRESS_ALGORITHMS the client accepts; br and zstd need the
+    # brotli and zstandard packages
+    COMPRESS_ENABLED = os.environ.get("COMPRESS_ENABLED", "1") == "1"
+    COMPRESS_ALGORITHMS = os.environ.get("COMPRESS_ALGORITHMS", "zstd,br,gzip")
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_BR_LEVEL = int(os.environ.get("COMPRESS_BR_LEVEL", 4))
+    COMPRESS_ZSTD_LEVEL = int(os.environ.get("COMPRESS_ZSTD_LEVEL", 3))
+    # answer the analytics endpoints from the daily rollups when possible
+    STATS_USE_ROLLUPS = os.environ.get("STATS_USE_ROLLUPS", "1") == "1"
 
 
 class DevelopmentConfig(Config):
@@ -0,0 +1,63 @@
+"""Gunicorn settings, read from the environment
+
+WEB_CONCURRENCY sets the number of worker processes (Heroku sets it from the
+dyno size), GUNICORN_THREADS the threads per gthread worker and
+GUNICORN_WORKER_CLASS the worker class: gthread (default), sync, gevent
+(needs gevent and psycogreen installed) or uvicorn.workers.UvicornWorker to
+serve `asgi:app`.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+# load the app once in the master, workers are forked with it already imported
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+# the Heroku router keeps connections to the dynos open
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# recycle workers now and then so a leak cannot grow forever, with jitter so
+# they do not all restart at once
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+
+# workers write their metrics to files in this directory, which /metrics
+# adds up; it is emptied here, before the app is loaded, on every start
+prometheus_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(tempfile.gettempdir(), "orders-api-metrics"),
+)
+shutil.rmtree(prometheus_dir, ignore_errors=True)
+os.makedirs(prometheus_dir)
+
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+
+        patch_psycopg()
+    if preload_app:
+        from backend.pool import dispose_engines
+
+        app = server.app.wsgi()
+        # the ASGI app wraps the Flask app
+        flask_app = getattr(getattr(app, "state", None), "flask_app", app)
+        dispose_engines(flask_app)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from backend import db
+from backend.models import Customer, Order
+
+
+def add_orders():
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    c_2 = Customer(name="other name", email="other@dummy.com", contact="contact")
+    db.session.add_all([c, c_2])
+    db.session.add_all(
+        [
+            Order(customer=c, item="apple", amount=100, time=datetime(2023, 9, 1, 8)),
+            Order(customer=c, item="banana", amount=300, time=datetime(2023, 9, 1, 9)),
+            Order(customer=c_2, item="apple", amount=50, time=datetime(2023, 10, 2)),
+        ]
+    )
+    db.session.commit()
+    return c, c_2
+
+
+def test_stats_summary(client):
+    add_orders()
+
+    response = client.get("/api/v1/stats/summary")
+    response_2 = client.get("/api/v1/stats/summary?since=2023-10-01")
+
+    assert response.status_code == 200
+    assert response.json == {
+        "count": 3,
+        "total": 450.0,
+        "average": 150.0,
+        "min": 50.0,
+        "max": 300.0,
+    }
+    assert response_2.json["count"] == 1
+    assert response_2.json["total"] == 50.0
+
+
+def test_stats_grouped(client):
+    c, c_2 = add_orders()
+
+    customers = client.get("/api/v1/stats/customers").json
+    items = client.get("/api/v1/stats/items?limit=1").json
+
+    assert [(s["customer_id"], s["total"]) for s in customers] == [
+        (c.id, 400.0),
+        (c_2.id, 50.0),
+    ]
+    assert len(items) == 1
+    assert items[0]["item"] == "banana"
+
+
+def test_stats_grouped_ignore_cursor(client):
+    add_orders()
+
+    # grouped stats are not paginated by cursor, a stray one is no error
+    response = client.get("/api/v1/stats/customers?cursor=stale")
+    response_2 = client.get("/api/v1/stats/items?limit=1&cursor=stale")
+
+    assert response.status_code == 200
+    assert len(response.json) == 2
+    assert response_2.status_code == 200
+    assert len(response_2.json) == 1
+
+
+def test_stats_timeseries(client):
+    add_orders()
+
+    days = client.get("/api/v1/stats/timeseries").json
+    months = client.get("/api/v1/stats/timeseries?bucket=month").json
+    response = client.get("/api/v1/stats/timeseries?bucket=year")
+
+    assert [d["count"] for d in days] == [2, 1]
+    assert [m["total"] for m in months] == [400.0, 50.0]
+    assert response.status_code == 400
@@ -1,5 +1,16 @@
+import json
+import os
+import subprocess
+import sys
+
 from flask import current_app
 
+from backend import create_app
+from backend.auth import get_oauth_client
+from tests.conftest import TestingConfig
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
 def test_testing_config(app):
     assert app.config["DEBUG"]
@@ -45,3 +56,67 @@ def test_logout(client):
     assert (
         "<p>You should be redirected automatically to the target URL:" in response.text
     )
+
+
+def test_lazy_imports():
+    # a fresh interpreter, as this one already imported everything
+    script = (
+        "import sys, json\n"
+        "from backend import create_app\n"
+        "from tests.conftest import TestingConfig\n"
+        "create_app(TestingConfig)\n"
+        "print(json.dumps(sorted(sys.modules)))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    modules = json.loads(output)
+
+    for name in ["flasgger", "authlib", "africastalking", "requests"]:
+        assert name not in modules
+
+
+def test_oauth_client(app):
+    client = get_oauth_client()
+
+    assert client.name == "OrdersAPI"
+    assert get_oauth_client() is client
+
+
+def test_apidocs(client):
+    response = client.get("/apidocs/")
+    response_2 = client.get("/apispec_1.json")
+
+    assert response.status_code == 200
+    assert response_2.status_code == 200
+    assert "/api/v1/orders" in response_2.json["paths"]
+    assert client.get("/flasgger_static/swagger-ui-bundle.js").status_code == 200
+
+
+def test_apidocs_spec_file(tmp_path):
+    path = tmp_path / "apispec.json"
+    path.write_text(json.dumps({"swagger": "2.0", "paths": {"/prebuilt": {}}}))
+
+    class SpecFileConfig(TestingConfig):
+        DEBUG = False
+        SWAGGER_SPEC_FILE = str(path)
+
+    response = create_app(SpecFileConfig).test_client().get("/apispec_1.json")
+
+    assert list(response.json["paths"]) == ["/prebuilt"]
+
+
+def test_apidocs_build(tmp_path):
+    app = create_app(TestingConfig)
+    path = tmp_path / "apispec.json"
+
+    result = app.test_cli_runner().invoke(
+        args=["apidocs", "build", "--output", str(path)]
+    )
+
+    assert result.exit_code == 0
+    assert "/api/v1/customers" in json.loads(path.read_text())["paths"]
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime
+
+import pytest
+from starlette.testclient import TestClient
+
+from backend import db
+from backend.asgi import create_asgi_app
+from backend.models import Customer, Order
+from tests.conftest import TestingConfig
+
+
+@pytest.fixture
+def asgi_client(app):
+    asgi_app = create_asgi_app(TestingConfig)
+    with TestClient(asgi_app) as client:
+        yield client
+
+
+def add_orders():
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add(c)
+    for i in range(3):
+        db.session.add(
+            Order(
+                customer=c, item=f"item {i}", amount=100, time=datetime(2023, 9, i + 1)
+            )
+        )
+    db.session.commit()
+    return c
+
+
+def test_async_reads_match_sync(client, asgi_client):
+    c = add_orders()
+
+    for url in [
+        "/api/v1/customers",
+        "/api/v1/customers?include=orders&orders_limit=2",
+        f"/api/v1/customers/{c.id}?fields=name",
+        f"/api/v1/customers/{c.id}/orders?limit=2",
+        "/api/v1/orders?limit=2&item=item&fields=id,amount,time",
+        "/api/v1/orders/1",
+        "/api/v1/orders/404",
+        "/api/v1/orders?limit=0",
+    ]:
+        expected = client.get(url)
+        response = asgi_client.get(url)
+        assert response.status_code == expected.status_code, url
+        # the test clients use different host names
+        body = response.text.replace("http://testserver/", "http://localhost/")
+        assert json.loads(body) == expected.json, url
+        if "include" not in url:
+            assert response.headers.get("ETag") == expected.headers.get("ETag"), url
+        assert response.headers.get("X-Next-Cursor") == expected.headers.get(
+            "X-Next-Cursor"
+        )
+
+
+def test_async_conditional_and_stream(asgi_client):
+    add_orders()
+
+    response = asgi_client.get("/api/v1/orders/1")
+    response_2 = asgi_client.get(
+        "/api/v1/orders/1", headers={"If-None-Match": response.headers["ETag"]}
+    )
+    response_3 = asgi_client.get("/api/v1/orders?stream=1&fields=item")
+
+    assert response_2.status_code == 304
+    assert [json.loads(line) for line in response_3.text.splitlines()] == [
+        {"item": "item 0"},
+        {"item": "item 1"},
+        {"item": "item 2"},
+    ]
+
+
+def test_async_falls_back_to_flask(asgi_client):
+    data = {"name": "dummy name", "email": "dummy@dummy.com", "contact": "contact"}
+
+    response = asgi_client.post("/api/v1/customers", json=data)
+    response_2 = asgi_client.get("/api/v1/customers")
+    response_3 = asgi_client.get("/")
+
+    assert response.status_code == 201
+    assert [c["email"] for c in response_2.json()] == ["dummy@dummy.com"]
+    assert "<title>Home - Orders API</title>" in response_3.text
@@ -0,0 +1,125 @@
+import json
+
+from backend.cache import LRUCache, RedisCache, make_backend
+from backend.models import Customer
+from backend import cache, db
+
+
+class FakeRedis(object):
+    """Local stand-in for the parts of redis.Redis used by RedisCache"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match="*"):
+        return [key for key in self.data if key.startswith(match.rstrip("*"))]
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats() == {"backend": "lru", "hits": 3, "misses": 1, "size": 2}
+
+
+def test_lru_cache_expiry():
+    cache = LRUCache(default_timeout=60)
+    cache.set("a", 1, timeout=-1)
+    cache.set("b", 2)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+def test_redis_cache(app):
+    client = FakeRedis()
+    cache = RedisCache(client, key_prefix="test:")
+    cache.set("customer:1", {"id": 1, "name": "dummy name"})
+
+    assert json.loads(client.data["test:customer:1"])["name"] == "dummy name"
+    assert cache.get("customer:1") == {"id": 1, "name": "dummy name"}
+
+    cache.delete("customer:1")
+    assert cache.get("customer:1") is None
+    assert cache.stats() == {"backend": "redis", "hits": 1, "misses": 1}
+
+
+def test_make_redis_backend(app):
+    client = FakeRedis()
+    config = dict(app.config, CACHE_TYPE="redis", CACHE_KEY_PREFIX="test:")
+
+    backend = make_backend(config, redis_client=client)
+
+    assert isinstance(backend, RedisCache)
+    assert backend.client is client
+    assert backend.key_prefix == "test:"
+
+
+def test_get_customer_cached_in_redis(app, client):
+    redis_client = FakeRedis()
+    app.config["CACHE_TYPE"] = "redis"
+    cache.init_app(app, redis_client)
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add(c)
+    db.session.commit()
+
+    response = client.get(f"/api/v1/customers/{c.id}")
+    response_2 = client.get(f"/api/v1/customers/{c.id}")
+    stats = client.get("/api/v1/cache/stats").json
+
+    assert response.json == response_2.json
+    assert list(redis_client.data) == [f"orders-api:customer:{c.id}"]
+    assert stats == {"backend": "redis", "hits": 1, "misses": 1}
+
+    data = {"name": "new name", "email": "new@email.com", "contact": "contact"}
+    headers = {"Content-Type": "application/json"}
+    client.put(f"/api/v1/customers/{c.id}", data=json.dumps(data), headers=headers)
+
+    assert redis_client.data == {}
+    assert client.get(f"/api/v1/customers/{c.id}").json["name"] == "new name"
+
+    cache.clear()
+    assert redis_client.data == {}
+
+
+def test_get_customer_cached(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add(c)
+    db.session.commit()
+
+    response = client.get(f"/api/v1/customers/{c.id}")
+    response_2 = client.get(f"/api/v1/customers/{c.id}")
+    stats = client.get("/api/v1/cache/stats").json
+
+    assert response.json == response_2.json
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+
+    # writes through the API invalidate the cached entry
+    data = {"name": "new name", "email": "new@email.com", "contact": "contact"}
+    headers = {"Content-Type": "application/json"}
+    client.put(f"/api/v1/customers/{c.id}", data=json.dumps(data), headers=headers)
+    response_3 = client.get(f"/api/v1/customers/{c.id}")
+
+    assert response_3.json["name"] == "new name"
+
+    client.delete(f"/api/v1/customers/{c.id}")
+    response_4 = client.get(f"/api/v1/customers/{c.id}")
+
+    assert response_4.status_code == 404
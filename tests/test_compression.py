@@ -0,0 +1,149 @@
+import gzip
+import logging
+import sys
+import zlib
+
+import pytest
+
+from backend import create_app, db
+from backend.compression import make_codecs
+from backend.models import Customer, Order
+from tests.conftest import TestingConfig
+
+
+def add_orders(count):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add(c)
+    for i in range(count):
+        db.session.add(Order(customer=c, item=f"dummy item {i}", amount=100))
+    db.session.commit()
+
+
+def test_gzip(client):
+    add_orders(50)
+
+    response = client.get("/api/v1/orders", headers={"Accept-Encoding": "gzip"})
+    response_2 = client.get("/api/v1/orders")
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.vary
+    assert int(response.headers["Content-Length"]) < len(response_2.data)
+    assert gzip.decompress(response.data) == response_2.data
+    assert "Content-Encoding" not in response_2.headers
+
+
+def test_below_threshold(client):
+    add_orders(1)
+
+    response = client.get("/api/v1/orders", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.vary
+
+
+def test_negotiation(client):
+    add_orders(50)
+
+    def encoding(accept):
+        response = client.get("/api/v1/orders", headers={"Accept-Encoding": accept})
+        return response.headers.get("Content-Encoding")
+
+    assert encoding("identity") is None
+    assert encoding("gzip;q=0") is None
+    assert encoding("deflate, gzip") == "gzip"
+    assert encoding("gzip, br;q=0.5") == "gzip"
+
+
+def test_negotiation_prefers_zstd(client):
+    pytest.importorskip("zstandard")
+    add_orders(50)
+
+    response = client.get("/api/v1/orders", headers={"Accept-Encoding": "*"})
+
+    assert response.headers["Content-Encoding"] == "zstd"
+
+
+@pytest.mark.parametrize("name", ["br", "zstd"])
+def test_brotli_and_zstd(client, name):
+    module = pytest.importorskip({"br": "brotli", "zstd": "zstandard"}[name])
+    add_orders(50)
+
+    response = client.get("/api/v1/orders", headers={"Accept-Encoding": name})
+    response_2 = client.get("/api/v1/orders")
+
+    assert response.headers["Content-Encoding"] == name
+    if name == "br":
+        assert module.decompress(response.data) == response_2.data
+    else:
+        decompressor = module.ZstdDecompressor()
+        assert decompressor.decompress(response.data) == response_2.data
+
+
+def test_weak_etag(client):
+    add_orders(50)
+
+    response = client.get("/api/v1/orders", headers={"Accept-Encoding": "gzip"})
+    etag = response.headers["ETag"]
+    response_2 = client.get(
+        "/api/v1/orders", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+    )
+    response_3 = client.get("/api/v1/orders", headers={"If-None-Match": etag})
+
+    assert etag.startswith('W/"')
+    assert response_2.status_code == 304
+    assert response_2.headers["ETag"] == etag
+    assert response_3.status_code == 304
+
+
+def test_streamed(client):
+    add_orders(3)
+
+    # streamed bodies have to be consumed before the next request
+    response = client.get(
+        "/api/v1/orders?stream=1", headers={"Accept-Encoding": "gzip"}
+    )
+    data = zlib.decompress(response.data, wbits=31)
+    response_2 = client.get("/api/v1/orders?stream=1")
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert data == response_2.data
+
+
+def test_not_compressible(client):
+    response = client.get(
+        "/flasgger_static/favicon-32x32.png", headers={"Accept-Encoding": "gzip"}
+    )
+
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+
+
+def test_compression_disabled():
+    class NoCompressionConfig(TestingConfig):
+        COMPRESS_ENABLED = False
+
+    client = create_app(NoCompressionConfig).test_client()
+    response = client.get("/apidocs/", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in response.headers
+
+
+def test_unknown_algorithm():
+    class UnknownConfig(TestingConfig):
+        COMPRESS_ALGORITHMS = "gzip,lzma"
+
+    with pytest.raises(ValueError):
+        create_app(UnknownConfig)
+
+
+def test_missing_algorithm(app, monkeypatch, caplog):
+    # an install without brotli offers the other algorithms
+    monkeypatch.setitem(sys.modules, "brotli", None)
+
+    with caplog.at_level(logging.WARNING):
+        codecs = make_codecs(app)
+
+    assert "br" not in [codec.name for codec in codecs]
+    assert "gzip" in [codec.name for codec in codecs]
+    assert "br is not available" in caplog.text
@@ -0,0 +1,147 @@
+import threading
+from datetime import datetime, timedelta
+
+from backend import db
+from backend.idempotency import purge
+from backend.models import Customer, IdempotencyKey, Order
+
+
+def add_customer():
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add(c)
+    db.session.commit()
+    return c.id
+
+
+def post_order(client, key, customer_id, amount=100):
+    return client.post(
+        "/api/v1/orders",
+        json={"customer_id": customer_id, "item": "dummy item", "amount": amount},
+        headers={"Idempotency-Key": key},
+    )
+
+
+def test_replay(client):
+    customer_id = add_customer()
+
+    response = post_order(client, "key-1", customer_id)
+    response_2 = post_order(client, "key-1", customer_id)
+
+    assert response.status_code == 201
+    assert response_2.status_code == 201
+    assert response_2.data == response.data
+    assert response_2.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in response.headers
+    assert Order.query.count() == 1
+
+
+def test_replay_stored_values(client):
+    customer_id = add_customer()
+
+    response = post_order(client, "key-1", customer_id, amount=10.005)
+    response_2 = post_order(client, "key-1", customer_id, amount=10.005)
+    # a fresh session, so the order is read back from the database
+    db.session.expunge_all()
+    response_3 = client.get(f"/api/v1/orders/{response.json['id']}")
+
+    # the amount as the Numeric(10, 2) column rounded it, not as sent
+    assert response.json["amount"] == 10.01
+    assert response_2.json == response.json
+    assert response_3.json == response.json
+
+
+def test_without_key(client):
+    customer_id = add_customer()
+
+    for _ in range(2):
+        client.post(
+            "/api/v1/orders",
+            json={"customer_id": customer_id, "item": "dummy item", "amount": 100},
+        )
+
+    assert Order.query.count() == 2
+    assert IdempotencyKey.query.count() == 0
+
+
+def test_key_reused_with_another_request(client):
+    customer_id = add_customer()
+
+    post_order(client, "key-1", customer_id)
+    response = post_order(client, "key-1", customer_id, amount=200)
+
+    assert response.status_code == 422
+    assert "different request" in response.json["error"]
+    assert Order.query.count() == 1
+
+
+def test_failed_request_is_not_stored(client):
+    customer_id = add_customer()
+
+    response = client.post(
+        "/api/v1/orders",
+        json={"customer_id": customer_id},
+        headers={"Idempotency-Key": "key-1"},
+    )
+    response_2 = post_order(client, "key-1", customer_id)
+
+    assert response.status_code == 400
+    assert response_2.status_code == 201
+    assert Order.query.count() == 1
+
+
+def test_bulk_replay(client):
+    customer_id = add_customer()
+    rows = [{"customer_id": customer_id, "item": "dummy item", "amount": 100}] * 3
+
+    response = client.post(
+        "/api/v1/orders/bulk", json=rows, headers={"Idempotency-Key": "key-1"}
+    )
+    response_2 = client.post(
+        "/api/v1/orders/bulk", json=rows, headers={"Idempotency-Key": "key-1"}
+    )
+
+    assert response_2.json == response.json
+    assert Order.query.count() == 3
+
+
+def test_concurrent_retries(app):
+    customer_id = add_customer()
+    responses = []
+
+    def retry():
+        responses.append(post_order(app.test_client(), "key-1", customer_id))
+
+    threads = [threading.Thread(target=retry) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [r.status_code for r in responses] == [201] * 5
+    assert len({r.json["id"] for r in responses}) == 1
+    assert Order.query.count() == 1
+
+
+def test_expired_key(client):
+    customer_id = add_customer()
+    post_order(client, "key-1", customer_id)
+    db.session.get(IdempotencyKey, "key-1").expires_at = datetime.utcnow()
+    db.session.commit()
+
+    response = post_order(client, "key-1", customer_id, amount=200)
+
+    assert response.status_code == 201
+    assert "Idempotent-Replayed" not in response.headers
+    assert Order.query.count() == 2
+
+
+def test_purge(client):
+    customer_id = add_customer()
+    post_order(client, "key-1", customer_id)
+    post_order(client, "key-2", customer_id)
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    db.session.get(IdempotencyKey, "key-1").expires_at = expired
+    db.session.commit()
+
+    assert purge() == 1
+    assert [k.key for k in IdempotencyKey.query] == ["key-2"]
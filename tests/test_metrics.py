@@ -0,0 +1,85 @@
+import logging
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import exc
+
+from backend import create_app, db
+from tests.conftest import TestingConfig
+
+
+def get_sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_server_timing(client):
+    response = client.get("/api/v1/orders")
+
+    assert response.status_code == 200
+    db_timing, app_timing = response.headers["Server-Timing"].split(", ")
+    assert db_timing.startswith('db;desc="1 queries";dur=')
+    assert app_timing.startswith("app;dur=")
+
+
+def test_request_metrics(client):
+    labels = {"method": "GET", "endpoint": "main.get_customers", "status": "200"}
+    count = get_sample("orders_api_request_duration_seconds_count", **labels)
+    queries = get_sample(
+        "orders_api_request_db_queries_sum", endpoint="main.get_customers"
+    )
+
+    client.get("/api/v1/customers")
+    client.get("/api/v1/customers")
+
+    assert (
+        get_sample("orders_api_request_duration_seconds_count", **labels) == count + 2
+    )
+    assert (
+        get_sample("orders_api_request_db_queries_sum", endpoint="main.get_customers")
+        == queries + 2
+    )
+
+
+def test_metrics_endpoint(client):
+    client.get("/api/v1/orders")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert 'endpoint="main.get_orders"' in response.text
+    assert "orders_api_request_db_duration_seconds_bucket" in response.text
+
+
+def test_slow_query_log(app, client, caplog):
+    app.config["DB_SLOW_QUERY_MS"] = 50
+    count = get_sample("orders_api_db_slow_queries_total", endpoint="none")
+
+    with caplog.at_level(logging.WARNING):
+        db.session.execute(db.text("SELECT pg_sleep(0.06)"))
+        db.session.execute(db.text("SELECT 1"))
+
+    slow = [r.message for r in caplog.records if "[SLOW QUERY]" in r.message]
+    assert len(slow) == 1
+    assert "pg_sleep" in slow[0]
+    assert get_sample("orders_api_db_slow_queries_total", endpoint="none") == count + 1
+
+
+def test_failed_query_timing(app):
+    with db.engine.connect() as connection:
+        with pytest.raises(exc.ProgrammingError):
+            connection.execute(db.text("SELECT * FROM nowhere"))
+        connection.rollback()
+        connection.execute(db.text("SELECT 1"))
+
+        # the failed statement left no start time behind on the connection
+        assert connection.info["query_started"] == []
+
+
+def test_metrics_disabled():
+    class NoMetricsConfig(TestingConfig):
+        METRICS_ENABLED = False
+
+    client = create_app(NoMetricsConfig).test_client()
+
+    assert client.get("/metrics").status_code == 404
+    assert "Server-Timing" not in client.get("/api/v1/nonexistent").headers
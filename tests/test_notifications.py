@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from backend import db, notification_queue
+from backend.models import Customer, Notification
+
+
+def test_process_pending_batches_per_sender(app):
+    notification_queue.enqueue("+254700000001", "hello", "ORDERS")
+    notification_queue.enqueue("+254700000002", "hello", "ORDERS")
+    notification_queue.enqueue("+254700000003", "bye", "ORDERS")
+
+    processed = notification_queue.process_pending()
+
+    outbox = notification_queue.sms_service.outbox
+    assert processed == 3
+    # identical messages of a sender are sent in one request
+    assert {
+        "message": "hello",
+        "recipients": ["+254700000001", "+254700000002"],
+        "sender": "ORDERS",
+    } in outbox
+    assert len(outbox) == 2
+    statuses = [n.status for n in Notification.query.all()]
+    assert statuses == ["sent", "sent", "sent"]
+
+
+def test_process_pending_retries_with_backoff(app):
+    app.config["NOTIFICATIONS_MAX_ATTEMPTS"] = 2
+    notification_queue.sms_service.fail_with = RuntimeError("provider down")
+    notification = notification_queue.enqueue("+254700000001", "hello")
+
+    notification_queue.process_pending()
+
+    db.session.refresh(notification)
+    assert notification.status == "pending"
+    assert notification.attempts == 1
+    assert notification.last_error == "provider down"
+    assert notification.next_attempt_at > datetime.utcnow()
+    # not due yet
+    assert notification_queue.process_pending() == 0
+
+    notification.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    notification_queue.process_pending()
+
+    db.session.refresh(notification)
+    assert notification.status == "failed"
+    assert notification.attempts == 2
+
+
+def test_make_order_queues_confirmation(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="254712345678")
+    db.session.add(c)
+    db.session.commit()
+    with client.session_transaction() as session:
+        session["user"] = {
+            "personData": {},
+            "userinfo": {"email": "dummy@dummy.com", "name": "dummy name"},
+        }
+
+    client.post("/orders", data={"item": "dummy item", "amount": 100})
+
+    notification = Notification.query.one()
+    assert notification.recipient == "+254712345678"
+    assert "dummy item" in notification.message
+    assert notification.status == "pending"
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, exc
+from sqlalchemy.pool import NullPool
+
+from backend import create_app, db
+from backend.asgi import make_async_engine
+from backend.pool import TimedQueuePool, configure_pool, dispose_engines
+from config import get_engine_options
+from tests.conftest import TestingConfig
+
+
+def test_pool_stats(client):
+    response = client.get("/api/v1/db/pool")
+    client.get("/api/v1/customers")
+    response_2 = client.get("/api/v1/db/pool")
+
+    assert response.status_code == 200
+    assert response.json["pool"] == "queue"
+    assert response_2.json["checkouts"] > response.json["checkouts"]
+
+
+def test_pool_timeouts():
+    engine = create_engine(
+        "sqlite://",
+        poolclass=TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.01,
+    )
+    connection = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    connection.close()
+
+    stats = engine.pool.stats()
+    assert stats["checkouts"] == 2
+    assert stats["timeouts"] == 1
+    assert stats["wait_seconds_max"] >= 0.01
+    assert stats["checked_out"] == 0
+
+
+def test_null_pool():
+    class NullPoolConfig(TestingConfig):
+        DB_POOL_CLASS = "null"
+
+    app = create_app(NullPoolConfig)
+
+    with app.app_context():
+        assert isinstance(db.engine.pool, NullPool)
+        assert "pool_size" not in app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+        assert db.session.execute(db.text("SELECT 1")).scalar() == 1
+
+    with pytest.raises(ValueError):
+        configure_pool({"DB_POOL_CLASS": "pgbouncer"})
+
+
+def test_engine_options(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "2")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "0")
+
+    options = get_engine_options()
+
+    assert options["pool_size"] == 2
+    assert options["pool_pre_ping"] is False
+    # no libpq startup options, which PgBouncer refuses
+    assert "connect_args" not in options
+
+
+def test_statement_timeout():
+    class TimeoutConfig(TestingConfig):
+        DB_STATEMENT_TIMEOUT = 100
+
+    app = create_app(TimeoutConfig)
+    show = db.text("SHOW statement_timeout")
+
+    with app.app_context():
+        assert db.session.execute(show).scalar() == "100ms"
+        # kept by the connection the pool rolled back
+        db.session.remove()
+        assert db.session.execute(show).scalar() == "100ms"
+        with pytest.raises(exc.OperationalError, match="statement timeout"):
+            db.session.execute(db.text("SELECT pg_sleep(1)"))
+        db.session.remove()
+        db.engine.dispose()
+
+    async_engine = make_async_engine(app.config)
+
+    async def show_async():
+        async with async_engine.connect() as connection:
+            value = await connection.scalar(show)
+        await async_engine.dispose()
+        return value
+
+    assert asyncio.run(show_async()) == "100ms"
+
+
+def test_dispose_engines(app):
+    with db.engine.connect() as connection:
+        connection.execute(db.text("SELECT 1"))
+    assert db.engine.pool.checkedin() == 1
+
+    dispose_engines(app)
+
+    assert db.engine.pool.checkedin() == 0
+    assert db.session.execute(db.text("SELECT 1")).scalar() == 1
@@ -1,8 +1,11 @@
 # from flask import url_for, request
 import json
+import threading
+from datetime import datetime
+from decimal import Decimal
 
 from backend.models import Customer, Order
-from backend import db
+from backend import db, services
 
 
 def test_index(client):
@@ -104,6 +107,64 @@ def test_index_logged_in(client):
 #     )
 
 
+def test_update_customer_form_submit(client):
+    with client.session_transaction() as session:
+        session["user"] = {
+            "personData": {},
+            "userinfo": {
+                "email": "dummyname@email.com",
+                "name": "dummy name",
+            },
+        }
+
+    data = {"name": "new name", "email": "new@email.com", "contact": "254712345678"}
+    response = client.post("/", data=data)
+
+    assert response.status_code == 302
+    customer = db.session.query(Customer).one()
+    assert customer.name == "new name"
+    assert customer.contact == "254712345678"
+
+
+def test_make_order_form_submit(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="254712345678")
+    db.session.add(c)
+    db.session.commit()
+    with client.session_transaction() as session:
+        session["user"] = {
+            "personData": {},
+            "userinfo": {"email": "dummy@dummy.com", "name": "dummy name"},
+        }
+
+    response = client.post("/orders", data={"item": "dummy item", "amount": 100})
+
+    assert response.status_code == 302
+    order = db.session.query(Order).one()
+    assert order.item == "dummy item"
+    assert order.customer_id == c.id
+
+
+def test_make_order_form_flashes(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="254712345678")
+    db.session.add(c)
+    db.session.commit()
+    with client.session_transaction() as session:
+        session["user"] = {
+            "personData": {},
+            "userinfo": {"email": "dummy@dummy.com", "name": "dummy name"},
+        }
+
+    response = client.post(
+        "/orders",
+        data={"item": "dummy item", "amount": 100},
+        follow_redirects=True,
+    )
+
+    # the flashed message survives the session round trip to the redirect
+    assert response.status_code == 200
+    assert "Order made successfully" in response.text
+
+
 def test_orders(client):
     response = client.get("/orders")
 
@@ -111,6 +172,75 @@ def test_orders(client):
     assert "<title>Orders - Orders API</title>" in response.text
 
 
+def test_customer_id_in_session(client):
+    with client.session_transaction() as session:
+        session["user"] = {
+            "personData": {},
+            "userinfo": {"email": "dummy@dummy.com", "name": "dummy name"},
+        }
+
+    # a session from before the id was stored resolves it on its first view
+    client.get("/")
+    with client.session_transaction() as session:
+        customer_id = session["customer_id"]
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        # the session lookup of the server-side session store aside
+        if "user_sessions" not in statement:
+            statements.append(statement)
+
+    db.event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/orders")
+    finally:
+        db.event.remove(db.engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert customer_id == db.session.query(Customer).one().id
+    # the orders of the customer, and no customer lookup
+    assert len(statements) == 1
+    assert "FROM customers" not in statements[0]
+
+
+def test_customer_id_after_email_update(client):
+    with client.session_transaction() as session:
+        session["user"] = {
+            "personData": {},
+            "userinfo": {"email": "dummy@dummy.com", "name": "dummy name"},
+        }
+    client.get("/")
+
+    data = {"name": "new name", "email": "new@email.com", "contact": "254712345678"}
+    client.post("/", data=data)
+    client.post("/orders", data={"item": "dummy item", "amount": 100})
+
+    customer = db.session.query(Customer).one()
+    assert customer.email == "new@email.com"
+    assert db.session.query(Order).one().customer_id == customer.id
+
+
+def test_get_or_create_customer_id_concurrently(app):
+    ids = []
+
+    def login():
+        with app.app_context():
+            ids.append(
+                services.get_or_create_customer_id(
+                    "dummy name", "dummy@dummy.com", "contact"
+                )
+            )
+
+    threads = [threading.Thread(target=login) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(ids)) == 1
+    assert db.session.query(Customer).one().id == ids[0]
+
+
 def test_get_customers(client):
     # dummy customer
     c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
@@ -154,6 +284,72 @@ def test_post_customers(client):
     assert "Missing contact field in the data provided!" in response_3.text
 
 
+def test_post_customers_duplicate_email(client):
+    data = {"name": "dummy name", "email": "dummy@email.com", "contact": "contact"}
+    headers = {"Content-Type": "application/json"}
+
+    response = client.post("/api/v1/customers", data=json.dumps(data), headers=headers)
+    response_2 = client.post(
+        "/api/v1/customers", data=json.dumps(data), headers=headers
+    )
+
+    assert response.status_code == 201
+    assert response_2.status_code == 409
+    assert "already exists" in response_2.text
+
+
+def test_post_customers_invalid(client):
+    data = {"name": None, "email": "dummy@email.com", "contact": "contact"}
+    headers = {"Content-Type": "application/json"}
+
+    response = client.post("/api/v1/customers", data=json.dumps(data), headers=headers)
+    response_2 = client.post(
+        "/api/v1/customers",
+        data=json.dumps(dict(data, name="dummy name", contact="2547123456789")),
+        headers=headers,
+    )
+
+    # refused before the database sees them, and not as a duplicate email
+    assert response.status_code == 400
+    assert response.json == {"error": "name must be a string of 1 to 255 characters!"}
+    assert response_2.status_code == 400
+    assert "contact must be a string" in response_2.text
+    assert db.session.query(Customer).count() == 0
+
+
+def test_post_customers_bulk(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add(c)
+    db.session.commit()
+
+    data = [
+        {"name": "new name", "email": "dummy@dummy.com", "contact": "254712345678"},
+        {"name": "other name", "email": "other@dummy.com", "contact": "contact"},
+        {"name": "last name", "email": "other@dummy.com", "contact": "contact"},
+    ]
+    headers = {"Content-Type": "application/json"}
+    response = client.post(
+        "/api/v1/customers/bulk", data=json.dumps(data), headers=headers
+    )
+    response_2 = client.post(
+        "/api/v1/customers/bulk",
+        data=json.dumps([{"name": "no email", "contact": "contact"}]),
+        headers=headers,
+    )
+
+    assert response.status_code == 200
+    assert response.json == {"created": 1, "updated": 1}
+    db.session.expire_all()
+    assert db.session.get(Customer, c.id).name == "new name"
+    # the last record sent for an email wins
+    assert Customer.query.filter_by(email="other@dummy.com").one().name == "last name"
+
+    assert response_2.status_code == 400
+    assert response_2.json["errors"] == [
+        {"index": 0, "error": "Missing email field in the data provided!"}
+    ]
+
+
 def test_put_customers(client):
     # dummy customer
     c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
@@ -244,6 +440,210 @@ def test_get_orders(client):
     assert response_2.status_code == 404
 
 
+def test_get_orders_pagination(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add(c)
+    for i in range(5):
+        db.session.add(Order(customer=c, item=f"dummy item {i}", amount=100))
+    db.session.commit()
+
+    response = client.get("/api/v1/orders?limit=2")
+    cursor = response.headers["X-Next-Cursor"]
+    response_2 = client.get(f"/api/v1/orders?limit=2&cursor={cursor}")
+    response_3 = client.get(
+        f"/api/v1/orders?limit=2&cursor={response_2.headers['X-Next-Cursor']}"
+    )
+
+    assert response.status_code == 200
+    assert [o["item"] for o in response.json] == ["dummy item 0", "dummy item 1"]
+    assert 'rel="next"' in response.headers["Link"]
+
+    assert [o["item"] for o in response_2.json] == ["dummy item 2", "dummy item 3"]
+
+    # last page has no next cursor
+    assert [o["item"] for o in response_3.json] == ["dummy item 4"]
+    assert "X-Next-Cursor" not in response_3.headers
+    assert "Link" not in response_3.headers
+
+
+def test_get_orders_filters(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    c_2 = Customer(name="other name", email="other@dummy.com", contact="contact")
+    db.session.add_all([c, c_2])
+    db.session.add_all(
+        [
+            Order(customer=c, item="apple", amount=100, time=datetime(2023, 9, 1)),
+            Order(customer=c, item="banana", amount=250, time=datetime(2023, 9, 10)),
+            Order(customer=c_2, item="apricot", amount=50, time=datetime(2023, 9, 5)),
+        ]
+    )
+    db.session.commit()
+
+    def items(query):
+        return sorted(o["item"] for o in client.get(f"/api/v1/orders?{query}").json)
+
+    assert items(f"customer_id={c.id}") == ["apple", "banana"]
+    assert items("since=2023-09-05&until=2023-09-10") == ["apricot"]
+    assert items("min_amount=60&max_amount=200") == ["apple"]
+    assert items("item=ap") == ["apple", "apricot"]
+    assert items(f"customer_id={c_2.id}&item=ap") == ["apricot"]
+
+    response = client.get("/api/v1/orders?since=yesterday")
+    response_2 = client.get("/api/v1/orders?min_amount=lots")
+
+    assert response.status_code == 400
+    assert "since must be an ISO-8601 date or datetime!" in response.text
+    assert response_2.status_code == 400
+
+
+def test_stream_orders(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add(c)
+    for i in range(3):
+        db.session.add(Order(customer=c, item=f"dummy item {i}", amount=100))
+    db.session.commit()
+
+    # streamed bodies have to be consumed before the next request
+    response = client.get("/api/v1/orders?stream=1")
+    lines = response.text.splitlines()
+    response_2 = client.get(
+        "/api/v1/orders", headers={"Accept": "application/x-ndjson"}
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert [json.loads(line)["item"] for line in lines] == [
+        "dummy item 0",
+        "dummy item 1",
+        "dummy item 2",
+    ]
+    assert response_2.text == response.text
+
+
+def test_get_customer_orders(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    c_2 = Customer(name="other name", email="other@dummy.com", contact="contact")
+    db.session.add_all([c, c_2])
+    for i in range(3):
+        db.session.add(Order(customer=c, item=f"dummy item {i}", amount=100))
+    db.session.add(Order(customer=c_2, item="other item", amount=100))
+    db.session.commit()
+
+    response = client.get(f"/api/v1/customers/{c.id}/orders?limit=2")
+    response_2 = client.get(
+        f"/api/v1/customers/{c.id}/orders?limit=2"
+        f"&cursor={response.headers['X-Next-Cursor']}"
+    )
+    response_3 = client.get("/api/v1/customers/404/orders")
+
+    assert response.status_code == 200
+    assert [o["item"] for o in response.json] == ["dummy item 0", "dummy item 1"]
+    assert f"/api/v1/customers/{c.id}/orders?" in response.headers["Link"]
+    assert [o["item"] for o in response_2.json] == ["dummy item 2"]
+    assert response_3.status_code == 404
+
+
+def test_get_customers_include_orders(client):
+    customers = [
+        Customer(name=f"name {i}", email=f"dummy{i}@dummy.com", contact="contact")
+        for i in range(3)
+    ]
+    db.session.add_all(customers)
+    for i in range(3):
+        db.session.add(Order(customer=customers[0], item=f"item {i}", amount=100))
+    db.session.add(Order(customer=customers[1], item="other item", amount=100))
+    db.session.commit()
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        response = client.get("/api/v1/customers?include=orders&orders_limit=2")
+    finally:
+        db.event.remove(db.engine, "before_cursor_execute", count)
+    response_2 = client.get(response.json[0]["orders_next"])
+    response_3 = client.get("/api/v1/customers?include=invoices")
+
+    assert response.status_code == 200
+    # one query for the customers and one for all of their orders
+    assert len(statements) == 2
+    first, second, third = response.json
+    assert [o["item"] for o in first["orders"]] == ["item 0", "item 1"]
+    assert [o["item"] for o in response_2.json] == ["item 2"]
+    assert [o["item"] for o in second["orders"]] == ["other item"]
+    assert second["orders_next"] is None
+    assert third["orders"] == []
+    assert response_3.status_code == 400
+    assert "Cannot include invoices!" in response_3.text
+
+
+def test_get_customers_invalid_page_args(client):
+    response = client.get("/api/v1/customers?cursor=not-a-cursor")
+    response_2 = client.get("/api/v1/customers?limit=0")
+    response_3 = client.get("/api/v1/customers?limit=abc")
+
+    assert response.status_code == 400
+    assert "Invalid cursor provided!" in response.text
+    assert response_2.status_code == 400
+    assert response_3.status_code == 400
+
+
+def test_get_order_conditional(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    o = Order(customer=c, item="dummy item", amount=100)
+    db.session.add_all([c, o])
+    db.session.commit()
+
+    response = client.get(f"/api/v1/orders/{o.id}")
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    response_2 = client.get(f"/api/v1/orders/{o.id}", headers={"If-None-Match": etag})
+    response_3 = client.get(
+        f"/api/v1/orders/{o.id}", headers={"If-Modified-Since": last_modified}
+    )
+
+    assert response.status_code == 200
+    assert response_2.status_code == 304
+    assert response_2.data == b""
+    assert response_3.status_code == 304
+
+    # once updated the old ETag no longer matches
+    data = {"customer_id": c.id, "item": "dummy item 2", "amount": 500}
+    headers = {"Content-Type": "application/json"}
+    client.put(f"/api/v1/orders/{o.id}", data=json.dumps(data), headers=headers)
+    response_4 = client.get(f"/api/v1/orders/{o.id}", headers={"If-None-Match": etag})
+
+    assert response_4.status_code == 200
+    assert response_4.headers["ETag"] != etag
+
+
+def test_get_orders_conditional(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add_all([c, Order(customer=c, item="dummy item", amount=100)])
+    db.session.commit()
+
+    response = client.get("/api/v1/orders")
+    response_2 = client.get(
+        "/api/v1/orders", headers={"If-None-Match": response.headers["ETag"]}
+    )
+    response_3 = client.get(
+        f"/api/v1/customers/{c.id}", headers={"If-None-Match": "stale"}
+    )
+    response_4 = client.get(
+        f"/api/v1/customers/{c.id}",
+        headers={"If-None-Match": response_3.headers["ETag"]},
+    )
+
+    assert response.status_code == 200
+    assert response_2.status_code == 304
+    assert response_3.status_code == 200
+    assert response_4.status_code == 304
+
+
 def test_post_orders(client):
     c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
 
@@ -278,6 +678,107 @@ def test_post_orders(client):
     assert "Missing name field in the data provided!" in response_3.text
 
 
+def test_post_orders_bulk(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add(c)
+    db.session.commit()
+
+    data = [
+        {"customer_id": c.id, "item": "dummy item 1", "amount": 100},
+        {"customer_id": c.id, "item": "dummy item 2", "amount": 250.5},
+    ]
+    headers = {"Content-Type": "application/json"}
+    response = client.post(
+        "/api/v1/orders/bulk", data=json.dumps(data), headers=headers
+    )
+
+    ndjson = "\n".join(json.dumps(row) for row in data)
+    response_2 = client.post(
+        "/api/v1/orders/bulk",
+        data=ndjson,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 201
+    assert response.json["created"] == 2
+    assert response_2.status_code == 201
+    ids = response.json["ids"] + response_2.json["ids"]
+    assert [db.session.get(Order, id).item for id in ids] == [
+        "dummy item 1",
+        "dummy item 2",
+        "dummy item 1",
+        "dummy item 2",
+    ]
+
+
+def test_post_orders_bulk_errors(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add(c)
+    db.session.commit()
+
+    data = [
+        {"customer_id": c.id, "item": "dummy item", "amount": 100},
+        {"customer_id": c.id, "item": "dummy item"},
+        {"customer_id": c.id + 1, "item": "dummy item", "amount": 100},
+        {"customer_id": c.id, "item": "dummy item", "amount": "lots"},
+    ]
+    headers = {"Content-Type": "application/json"}
+    response = client.post(
+        "/api/v1/orders/bulk", data=json.dumps(data), headers=headers
+    )
+    response_2 = client.post(
+        "/api/v1/orders/bulk", data=json.dumps({}), headers=headers
+    )
+
+    client.application.config["BULK_MAX_BATCH_SIZE"] = 1
+    response_3 = client.post(
+        "/api/v1/orders/bulk", data=json.dumps(data), headers=headers
+    )
+
+    assert response.status_code == 400
+    assert response.json["errors"] == [
+        {"index": 1, "error": "Missing amount field in the data provided!"},
+        {"index": 2, "error": "Customer not found"},
+        {"index": 3, "error": "amount must be a number!"},
+    ]
+    # nothing is created when a row is invalid
+    assert db.session.query(Order).count() == 0
+
+    assert response_2.status_code == 400
+    assert response_3.status_code == 413
+
+
+def test_post_orders_bulk_amount_bounds(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add(c)
+    db.session.commit()
+
+    headers = {"Content-Type": "application/json"}
+    data = [
+        {"customer_id": c.id, "item": "dummy item", "amount": 99999999.99},
+        {"customer_id": c.id, "item": "dummy item", "amount": 99999999.995},
+        {"customer_id": c.id, "item": "dummy item", "amount": 99999999.999},
+        {"customer_id": c.id, "item": "dummy item", "amount": -0.01},
+    ]
+    response = client.post(
+        "/api/v1/orders/bulk", data=json.dumps(data), headers=headers
+    )
+    response_2 = client.post(
+        "/api/v1/orders/bulk", data=json.dumps(data[:1]), headers=headers
+    )
+
+    # amounts rounding up past Numeric(10, 2) are refused, not a 500
+    error = "amount must be between 0 and 99999999.99!"
+    assert response.status_code == 400
+    assert response.json["errors"] == [
+        {"index": 1, "error": error},
+        {"index": 2, "error": error},
+        {"index": 3, "error": error},
+    ]
+    assert response_2.status_code == 201
+    assert db.session.query(Order).one().amount == Decimal("99999999.99")
+
+
 def test_put_orders(client):
     # dummy customer
     c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
@@ -0,0 +1,115 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from flask.json.tag import TaggedJSONSerializer
+
+from backend import db
+from backend.models import Customer, Order
+from backend.serializers import InvalidInclude, OrjsonProvider, get_include
+
+
+def test_orders_serialization(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    o = Order(customer=c, item="apple", amount=100.5, time=datetime(2023, 9, 1, 8, 30))
+    db.session.add_all([c, o])
+    db.session.commit()
+
+    response = client.get("/api/v1/orders")
+    response_2 = client.get(f"/api/v1/orders/{o.id}")
+    response_3 = client.get(f"/api/v1/customers/{c.id}/orders")
+
+    expected = {
+        "id": o.id,
+        "customer_id": c.id,
+        "item": "apple",
+        "amount": 100.5,
+        "time": "2023-09-01T08:30:00",
+    }
+    assert response.json == [expected]
+    assert response_2.json == expected
+    assert response_3.json == [expected]
+
+
+def test_decimal_as_string(client):
+    client.application.config["API_DECIMAL_AS_STRING"] = True
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    o = Order(customer=c, item="apple", amount=100.5, time=datetime(2023, 9, 1))
+    db.session.add_all([c, o])
+    db.session.commit()
+
+    response = client.get("/api/v1/orders")
+
+    assert response.json[0]["amount"] == "100.50"
+
+
+def test_orjson_provider(app):
+    assert isinstance(app.json, OrjsonProvider)
+    data = {"amount": Decimal("1.10"), "time": datetime(2023, 9, 1), 1: "one"}
+
+    assert app.json.dumps(data) == (
+        '{"amount":1.1,"time":"2023-09-01T00:00:00","1":"one"}'
+    )
+    assert app.json.loads(app.json.dumps([1, "a"])) == [1, "a"]
+
+
+def test_session_serializer(app):
+    # the session serializer tags tuples and untags them with object_hook
+    serializer = TaggedJSONSerializer()
+    flashes = [("message", "Order made successfully")]
+
+    assert serializer.loads(serializer.dumps({"_flashes": flashes})) == {
+        "_flashes": flashes
+    }
+
+
+def test_orders_fields(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    o = Order(customer=c, item="apple", amount=100.5, time=datetime(2023, 9, 1))
+    db.session.add_all([c, o])
+    db.session.commit()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/api/v1/orders?fields=amount,time")
+    finally:
+        db.event.remove(db.engine, "before_cursor_execute", record)
+    response_2 = client.get(f"/api/v1/orders/{o.id}?fields=item")
+    response_3 = client.get("/api/v1/orders?fields=amount,password")
+    response_4 = client.get("/api/v1/orders?fields=")
+
+    assert response.json == [{"amount": 100.5, "time": "2023-09-01T00:00:00"}]
+    # only the requested columns, and the id used by the pagination, are read
+    assert "orders.item" not in statements[0]
+    assert "orders.customer_id" not in statements[0]
+    assert response_2.json == {"item": "apple"}
+    assert response_3.status_code == 400
+    assert "Unknown fields password!" in response_3.text
+    assert response_4.status_code == 400
+
+
+def test_customers_fields(client):
+    c = Customer(name="dummy name", email="dummy@dummy.com", contact="contact")
+    db.session.add_all([c, Order(customer=c, item="apple", amount=100)])
+    db.session.commit()
+
+    response = client.get("/api/v1/customers?fields=name&include=orders")
+    response_2 = client.get(f"/api/v1/customers/{c.id}?fields=email,name")
+
+    assert response.json[0]["name"] == "dummy name"
+    assert "email" not in response.json[0]
+    assert [o["item"] for o in response.json[0]["orders"]] == ["apple"]
+    assert response_2.json == {"email": "dummy@dummy.com", "name": "dummy name"}
+    assert list(response_2.json) == ["email", "name"]
+
+
+def test_get_include():
+    assert get_include({}, ["orders"]) == []
+    assert get_include({"include": "orders"}, ["orders"]) == ["orders"]
+    with pytest.raises(InvalidInclude, match="Cannot include invoices!"):
+        get_include({"include": "orders,invoices"}, ["orders"])
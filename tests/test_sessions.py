@@ -0,0 +1,172 @@
+from datetime import datetime, timedelta
+
+from flask.sessions import SecureCookieSessionInterface
+
+from backend import create_app, db, routes
+from backend.models import Customer, UserSession
+from backend.sessions import purge
+from tests.conftest import TestingConfig
+
+PROFILE = {
+    "personData": {},
+    "userinfo": {"email": "dummy@dummy.com", "name": "dummy name"},
+}
+
+
+def session_cookie(client):
+    return client.get_cookie("session")
+
+
+def log_in(client):
+    with client.session_transaction() as session:
+        session["user"] = PROFILE
+
+
+def test_cookie_holds_only_the_id(client):
+    log_in(client)
+    response = client.get("/")
+
+    assert b"dummy name" in response.data
+    cookie = session_cookie(client)
+    # a signed random id, the data is in the table
+    assert len(cookie.value) < 100
+    assert "dummy" not in cookie.value
+    row = db.session.query(UserSession).one()
+    assert cookie.value.startswith(row.id)
+    assert "dummy@dummy.com" in row.data
+    assert row.expires_at > datetime.utcnow() + timedelta(days=6)
+
+
+def test_unchanged_session_not_written(client, app):
+    log_in(client)
+    client.get("/")
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "user_sessions" in statement:
+            statements.append(statement)
+
+    db.event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/orders")
+        client.get("/api/v1/customers")
+    finally:
+        db.event.remove(db.engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert "Cookie" in response.headers["Vary"]
+    # one lookup for the page, none for the API
+    assert len(statements) == 1
+    assert statements[0].startswith("SELECT")
+
+
+def test_expiring_session_extended(client):
+    log_in(client)
+    client.get("/")
+    row = db.session.query(UserSession).one()
+    row.expires_at = datetime.utcnow() + timedelta(days=1)
+    db.session.commit()
+
+    client.get("/")
+
+    db.session.expire_all()
+    assert db.session.get(UserSession, row.id).expires_at > datetime.utcnow() + (
+        timedelta(days=6)
+    )
+
+
+def test_tampered_cookie(client):
+    log_in(client)
+    cookie = session_cookie(client)
+    client.set_cookie("session", cookie.value[:-2] + "xx")
+
+    response = client.get("/")
+
+    assert b"dummy name" not in response.data
+
+
+def test_expired_session(client):
+    log_in(client)
+    db.session.execute(
+        db.update(UserSession).values(
+            expires_at=datetime.utcnow() - timedelta(seconds=1)
+        )
+    )
+    db.session.commit()
+
+    response = client.get("/")
+
+    assert b"dummy name" not in response.data
+    assert purge() == 1
+    assert db.session.query(UserSession).count() == 0
+
+
+def test_logout_deletes_session(client):
+    log_in(client)
+    client.get("/")
+
+    client.get("/logout")
+
+    assert db.session.query(UserSession).count() == 0
+    assert session_cookie(client) is None
+
+
+def test_cookie_sessions(app):
+    class CookieConfig(TestingConfig):
+        SESSION_TYPE = "cookie"
+
+    cookie_app = create_app(CookieConfig)
+    client = cookie_app.test_client()
+    log_in(client)
+
+    response = client.get("/")
+
+    assert isinstance(cookie_app.session_interface, SecureCookieSessionInterface)
+    assert b"dummy name" in response.data
+    assert db.session.query(UserSession).count() == 0
+
+
+class FakeOAuthClient(object):
+    def authorize_access_token(self):
+        return {
+            "access_token": "a" * 200,
+            "id_token": "i" * 1000,
+            "userinfo": {
+                "name": "dummy name",
+                "email": "dummy@dummy.com",
+                "picture": "https://example.com/" + "p" * 100,
+            },
+        }
+
+    def get(self, url, token):
+        class Response(object):
+            def json(self):
+                return {
+                    "resourceName": "people/1",
+                    "phoneNumbers": [
+                        {"value": "0712 345678", "canonicalForm": "+254712345678"}
+                    ],
+                }
+
+        return Response()
+
+
+def test_login_stores_slim_profile(client, monkeypatch):
+    monkeypatch.setattr(routes, "get_oauth_client", FakeOAuthClient)
+    with client.session_transaction() as session:
+        session["state"] = "planted"
+    old_id = session_cookie(client).value
+
+    client.get("/google-login")
+
+    # a new session id at login, the old one is gone
+    assert session_cookie(client).value != old_id
+    row = db.session.query(UserSession).one()
+    assert "access_token" not in row.data
+    assert "+254712345678" in row.data
+    with client.session_transaction() as session:
+        assert session["user"] == {
+            "userinfo": {"name": "dummy name", "email": "dummy@dummy.com"},
+            "personData": {"phoneNumbers": [{"canonicalForm": "+254712345678"}]},
+        }
+        assert session["customer_id"] == db.session.query(Customer).one().id